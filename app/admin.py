@@ -1,7 +1,30 @@
 from django.contrib import admin
-from app.models import Group, GroupMember, MealEntry, GroceryExpense
+from app.models import (
+    Group, GroupMember, MealEntry, GroceryExpense, MonthlyLedger,
+    MonthSnapshot, ArchivedMealEntry, ArchivedGroceryExpense, Settlement, Task,
+    AuditLog,
+)
 
 admin.site.register(Group)
 admin.site.register(GroupMember)
 admin.site.register(MealEntry)
 admin.site.register(GroceryExpense)
+admin.site.register(MonthlyLedger)
+admin.site.register(ArchivedMealEntry)
+admin.site.register(ArchivedGroceryExpense)
+admin.site.register(Settlement)
+admin.site.register(Task)
+
+
+@admin.register(MonthSnapshot)
+class MonthSnapshotAdmin(admin.ModelAdmin):
+    # Immutable, a month is reopened by deleting its snapshot
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    # Append-only
+    def has_change_permission(self, request, obj=None):
+        return False
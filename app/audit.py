@@ -0,0 +1,53 @@
+"""
+Recording of the AuditLog, the append-only history of meal and grocery changes.
+
+The rows of a record(..) call, a single change or every change of a bulk
+write, are inserted with one bulk_create once the transaction commits,
+nothing is written for a rolled back one.
+Meal counts are packed in one integer, 4 bits per count: the old
+breakfast, lunch and dinner in the high 12 bits, the new ones in the low 12
+"""
+from django.db import transaction
+from contextvars import ContextVar
+import functools
+
+
+# User id of who makes the changes, set by MembershipMiddleware for the request
+current_actor = ContextVar('audit_actor', default=None)
+
+COUNT_BITS = 4
+COUNT_MASK = (1 << COUNT_BITS) - 1
+
+
+def pack_meals(old, new) -> int:
+    """
+    Pack the old and new (breakfast, lunch, dinner) counts into an integer,
+    counts above 15 are stored as 15 (the forms allow 3 at most)
+    """
+    packed = 0
+    for count in (*old, *new):
+        packed = packed << COUNT_BITS | min(max(count, 0), COUNT_MASK)
+    return packed
+
+
+def unpack_meals(packed: int):
+    """
+    Return:
+        tuple(old counts, new counts), each (breakfast, lunch, dinner)
+    """
+    counts = [(packed >> (COUNT_BITS * shift)) & COUNT_MASK for shift in reversed(range(6))]
+    return tuple(counts[:3]), tuple(counts[3:])
+
+
+def write(rows):
+    type(rows[0]).objects.bulk_create(rows)
+
+
+def record(*rows):
+    """
+    Write AuditLog rows in one insert once the current transaction commits,
+    right away outside of one. Like any on_commit callback, the rows recorded
+    inside a savepoint that is rolled back are dropped along with it
+    """
+    if rows:
+        transaction.on_commit(functools.partial(write, rows))
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password
+
+
+class MembershipBackend(ModelBackend):
+    """
+    ModelBackend loading the user of a session together with its group 
+    membership and group, so group_required and user.group_membership.group 
+    don't need a query each
+    """
+    
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        """
+        ModelBackend.authenticate, loading the membership along with the user,
+        without upgrading an outdated password hash within the request, it's
+        left to app.hashers.rehash_later
+        """
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        
+        try:
+            user = UserModel._default_manager.select_related('group_membership__group').get(
+                **{UserModel.USERNAME_FIELD: username}
+            )
+        except UserModel.DoesNotExist:
+            # Hash anyway, an unknown user takes as long as a wrong password
+            UserModel().set_password(password)
+            return None
+        
+        if check_password(password, user.password) and self.user_can_authenticate(user):
+            return user
+        return None
+    
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('group_membership__group').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+    
+    async def aget_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = await UserModel._default_manager.select_related('group_membership__group').aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+import time
+
+from app.utils import is_past_month
+
+
+def summary_version_key(group_id, year, month):
+    return f'summary-version:{group_id}:{year}:{month}'
+
+
+def summary_version(group_id, year, month) -> int:
+    """Current version of the cached summary of a group-month"""
+    # Start from the clock, not 1, so a version key evicted from the cache 
+    # never comes back with a number that old entries were stored under
+    return cache.get_or_set(summary_version_key(group_id, year, month), time.time_ns(), timeout=None)
+
+
+async def asummary_version(group_id, year, month) -> int:
+    return await cache.aget_or_set(summary_version_key(group_id, year, month), time.time_ns(), timeout=None)
+
+
+def history_version_key(group_id):
+    return f'history-version:{group_id}'
+
+
+def history_version(group_id) -> int:
+    """Version of all the months of a group together, changes with any of them"""
+    return cache.get_or_set(history_version_key(group_id), time.time_ns(), timeout=None)
+
+
+def bump_summary_version(group_id, year, month):
+    """
+    Drop the cached summary of a group-month and the cached history of 
+    the group, once the current transaction commits so nobody caches 
+    the old rows again in between
+    """
+    def bump():
+        for key in [summary_version_key(group_id, year, month), history_version_key(group_id)]:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+    
+    transaction.on_commit(bump)
+
+
+def summary_timeout(year: int, month: int) -> int:
+    # Past months hardly ever change, keep them for long
+    if is_past_month(year, month):
+        return settings.SUMMARY_CACHE_PAST_TIMEOUT
+    return settings.SUMMARY_CACHE_TIMEOUT
+
+
+def get_cached_summary(group_id, year: int, month: int, compute):
+    """
+    Return the summary of a group-month from the cache, 
+    calling compute() to build and store it on a miss
+    """
+    version = summary_version(group_id, year, month)
+    key = f'summary:{group_id}:{year}:{month}:{version}'
+    
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute()
+        cache.set(key, summary, timeout=summary_timeout(year, month))
+    
+    return summary
+
+
+async def aget_cached_summary(group_id, year: int, month: int, compute):
+    """Async get_cached_summary(..), compute is a coroutine function"""
+    version = await asummary_version(group_id, year, month)
+    key = f'summary:{group_id}:{year}:{month}:{version}'
+    
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await compute()
+        await cache.aset(key, summary, timeout=summary_timeout(year, month))
+    
+    return summary
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.db.models import F
+from datetime import date
+from importlib.util import find_spec
+from uuid import uuid4
+import csv
+import os
+import shutil
+import tempfile
+import time
+
+from app.models import Group, MealEntry, GroceryExpense, MonthlyLedger
+from app.tasks import task
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes, for streaming"""
+    
+    def write(self, value):
+        return value
+
+
+def export_sections(group, start: date = None, end: date = None):
+    """
+    Meals, groceries and per-member settlement of a group between 
+    start (inclusive) and end (exclusive), whole history if not given.
+    Return: list of (title, header, rows) with rows as lazy iterators
+    """
+    meals = MealEntry.objects.filter(group=group)
+    groceries = GroceryExpense.objects.filter(group=group)
+    ledgers = MonthlyLedger.objects.filter(group=group).annotate(period=F('year') * 100 + F('month'))
+    
+    if start:
+        meals = meals.filter(date__gte=start)
+        groceries = groceries.filter(date__gte=start)
+        ledgers = ledgers.filter(period__gte=start.year * 100 + start.month)
+    if end:
+        meals = meals.filter(date__lt=end)
+        groceries = groceries.filter(date__lt=end)
+        ledgers = ledgers.filter(period__lt=end.year * 100 + end.month)
+    
+    # values_list(..).iterator(..) streams plain tuples in chunks, memory stays flat
+    return [
+        (
+            'Meals',
+            ['Date', 'Member', 'Phone', 'Breakfast', 'Lunch', 'Dinner', 'Total'],
+            meals.order_by('date', 'user_id').values_list(
+                'date', 'user__first_name', 'user__username', 'breakfast', 'lunch', 'dinner', 'total'
+            ).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        ),
+        (
+            'Groceries',
+            ['Date', 'Member', 'Phone', 'Item', 'Quantity', 'Cost'],
+            groceries.order_by('date', 'id').values_list(
+                'date', 'user__first_name', 'user__username', 'item_name', 'quantity', 'cost'
+            ).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        ),
+        (
+            'Settlement',
+            ['Year', 'Month', 'Member', 'Phone', 'Meals', 'Spent', 'Cost', 'Balance'],
+            ledgers.order_by('year', 'month', 'user_id').values_list(
+                'year', 'month', 'user__first_name', 'user__username', 'total_meals', 'spent', 'cost', 'balance'
+            ).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        ),
+    ]
+
+
+def stream_csv(sections):
+    """Yield CSV lines of all the sections, one after another"""
+    writer = csv.writer(Echo())
+    
+    for index, (title, header, rows) in enumerate(sections):
+        if index:
+            yield writer.writerow([])
+        yield writer.writerow([title])
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+def write_xlsx(sections):
+    """
+    Write the sections as sheets of an XLSX workbook (needs openpyxl)
+    Return: temporary file with the workbook, positioned at the start
+    """
+    # Optional dependency, only needed for XLSX exports
+    from openpyxl import Workbook
+    
+    # write_only mode streams the rows to disk instead of keeping them in memory
+    workbook = Workbook(write_only=True)
+    for title, header, rows in sections:
+        sheet = workbook.create_sheet(title)
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+    
+    file = tempfile.TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return file
+
+
+def xlsx_available() -> bool:
+    return find_spec('openpyxl') is not None
+
+
+def remove_old_exports():
+    """Delete the export files older than settings.EXPORT_KEEP_DAYS"""
+    cutoff = time.time() - settings.EXPORT_KEEP_DAYS * 24 * 60 * 60
+    
+    for entry in os.scandir(settings.EXPORT_ROOT):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+
+@task(max_attempts=3)
+def export_file(group_id: int, filename: str, file_format: str = 'xlsx', start: str = None, end: str = None) -> dict:
+    """
+    Write an export of a group to settings.EXPORT_ROOT, downloaded from
+    the export_download view once done
+    Args:
+        start, end: 'yyyy-mm-dd' as for export_sections, whole history if not given
+    Return:
+        dict(path, filename)
+    """
+    group = Group.objects.get(pk=group_id)
+    sections = export_sections(
+        group, 
+        date.fromisoformat(start) if start else None, 
+        date.fromisoformat(end) if end else None,
+    )
+    
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    remove_old_exports()
+    path = os.path.join(settings.EXPORT_ROOT, f'{uuid4().hex}.{file_format}')
+    
+    if file_format == 'xlsx':
+        with write_xlsx(sections) as workbook, open(path, 'wb') as file:
+            shutil.copyfileobj(workbook, file)
+    else:
+        with open(path, 'w', newline='') as file:
+            file.writelines(stream_csv(sections))
+    
+    return {'path': path, 'filename': f'{filename}.{file_format}'}
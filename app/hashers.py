@@ -0,0 +1,105 @@
+"""
+Password hashers with their cost taken from the settings, and the upgrade
+of outdated password hashes in the background, after the login response
+"""
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, get_user_model
+from django.contrib.auth.hashers import ScryptPasswordHasher, Argon2PasswordHasher, get_hasher, identify_hasher
+from django.db import connection
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with the cost of settings.PASSWORD_SCRYPT"""
+    work_factor = settings.PASSWORD_SCRYPT['work_factor']
+    block_size = settings.PASSWORD_SCRYPT['block_size']
+    parallelism = settings.PASSWORD_SCRYPT['parallelism']
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with the cost of settings.PASSWORD_ARGON2, needs `pip install argon2-cffi`"""
+    time_cost = settings.PASSWORD_ARGON2['time_cost']
+    memory_cost = settings.PASSWORD_ARGON2['memory_cost']
+    parallelism = settings.PASSWORD_ARGON2['parallelism']
+
+
+def needs_rehash(encoded: str) -> bool:
+    """Whether a password hash was made by another hasher, or with another cost, than the preferred one"""
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        # Unusable password
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+_executor = None
+# Rehashes queued or running, at most settings.PASSWORD_REHASH_BACKLOG
+_backlog = threading.BoundedSemaphore(settings.PASSWORD_REHASH_BACKLOG)
+
+
+def rehash_later(request, user, password: str):
+    """
+    Upgrade the password hash of a just logged in user once the response
+    is sent, instead of hashing the password a second time within the login.
+    The session hash changes with the password hash, the session of the
+    login is updated along with it so it stays logged in.
+    The job is kept on the request only, PasswordRehashMiddleware starts it
+    """
+    if not needs_rehash(user.password):
+        return
+    
+    request.password_rehash = (
+        user.pk, user.password, user.get_session_auth_hash(), request.session.session_key, password
+    )
+
+
+def start_rehash(request):
+    """
+    Hand the rehash of the request, if any, to the background threads. 
+    Skipped when the backlog is full, the next login of the user tries again
+    """
+    job = request.__dict__.pop('password_rehash', None)
+    if job is None:
+        return
+    
+    if not _backlog.acquire(blocking=False):
+        logger.info('Password rehash of user %s skipped, %d waiting already', job[0], settings.PASSWORD_REHASH_BACKLOG)
+        return
+    
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_REHASH_WORKERS, thread_name_prefix='rehash')
+    try:
+        _executor.submit(rehash, *job)
+    except RuntimeError:
+        # Executor shut down, the process is exiting
+        _backlog.release()
+
+
+def rehash(user_id, old_encoded: str, old_session_hash: str, session_key: str, password: str):
+    UserModel = get_user_model()
+    try:
+        user = UserModel(pk=user_id)
+        user.set_password(password)
+        
+        # Left alone if the password was changed meanwhile
+        updated = UserModel._default_manager.filter(pk=user_id, password=old_encoded).update(password=user.password)
+        if not updated or not session_key:
+            return
+        
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        if session.get(HASH_SESSION_KEY) == old_session_hash:
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.save()
+    except Exception:
+        logger.exception('Password rehash of user %s failed', user_id)
+    finally:
+        connection.close()
+        _backlog.release()
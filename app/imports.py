@@ -0,0 +1,168 @@
+from django.db import transaction
+from datetime import date
+from itertools import islice
+import csv
+
+from app.audit import record
+from app.models import AuditLog, GroupMember, MealEntry, GroceryExpense, MonthlyLedger, MonthSnapshot
+from app.tasks import rebuild_ledger
+from app.utils import parse_meal_count
+
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class CsvImport:
+    """
+    Import meals and groceries of a group from CSV files, streamed 
+    row by row and written with bulk_create in batches. 
+    Columns (case insensitive, the same as the export):
+        meals: Date, Phone, Breakfast, Lunch, Dinner
+        groceries: Date, Phone, Item, Quantity, Cost
+    Invalid rows are skipped and reported in errors, so are the rows of 
+    months the group admin locked, closed months that aren't locked are
+    reopened. Changes are logged in the AuditLog. Nothing is written in dry run mode.
+    """
+    
+    def __init__(self, group, dry_run=False, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.group = group
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.progress = progress    # called with (kind, rows done) after every batch
+        
+        self.imported = {'meals': 0, 'groceries': 0}
+        self.errors = []    # (kind, line, message)
+        
+        # phone number (username) -> user id of the group members
+        self.members = dict(
+            GroupMember.objects.filter(group=group).values_list('user__username', 'user_id')
+        )
+        self.locked = set(MonthSnapshot.objects.filter(group=group, locked=True).values_list('year', 'month'))
+    
+    def read(self, kind, file, parse_row):
+        """Yield model instances of the valid rows of a CSV file"""
+        reader = csv.DictReader(file)
+        
+        for row in reader:
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            try:
+                entry = parse_row(row)
+                if (entry.date.year, entry.date.month) in self.locked:
+                    raise ValueError(f"{entry.date:%B %Y} is closed and locked by the group admin")
+            except ValueError as e:
+                self.errors.append((kind, reader.line_num, str(e)))
+                continue
+            
+            yield entry
+    
+    def user_id(self, row):
+        phone = row.get('phone', '')
+        if phone not in self.members:
+            raise ValueError(f"'{phone}' is not a member of the group")
+        return self.members[phone]
+    
+    def parse_meal(self, row):
+        try:
+            meal_date = date.fromisoformat(row.get('date', ''))
+        except ValueError:
+            raise ValueError("Invalid date format")
+        try:
+            counts = [parse_meal_count(row.get(meal)) for meal in ['breakfast', 'lunch', 'dinner']]
+        except ValueError:
+            raise ValueError("Invalid meal value, numbers only")
+        
+        return MealEntry(
+            user_id=self.user_id(row), 
+            group=self.group, 
+            date=meal_date, 
+            breakfast=counts[0], lunch=counts[1], dinner=counts[2],
+        )
+    
+    def parse_grocery(self, row):
+        if not row.get('date') or not row.get('item'):
+            raise ValueError("Date and Item are required")
+        
+        try:
+            grocery_date = date.fromisoformat(row['date'])
+        except ValueError:
+            raise ValueError("Invalid date format")
+        try:
+            cost = int(row['cost']) if row.get('cost') else 0
+        except ValueError:
+            raise ValueError("Invalid cost value")
+        if cost < 0:
+            raise ValueError("Cost cannot be negative")
+        
+        return GroceryExpense(
+            user_id=self.user_id(row),
+            group=self.group,
+            date=grocery_date,
+            item_name=row['item'][:200],
+            quantity=row.get('quantity', '')[:50],
+            cost=cost,
+        )
+    
+    def write(self, kind, entries, save_batch, unique=list):
+        """
+        Save entries in batches, each in its own transaction
+        Args:
+            unique: drops the duplicates of a batch, the rows left are the ones written and counted
+        """
+        entries = iter(entries)
+        
+        while batch := unique(list(islice(entries, self.batch_size))):
+            if not self.dry_run:
+                with transaction.atomic():
+                    # bulk_create skips the model's check of a closed month
+                    MonthSnapshot.open_months(self.group.pk, {entry.date for entry in batch})
+                    save_batch(batch)
+            
+            self.imported[kind] += len(batch)
+            if self.progress:
+                self.progress(kind, self.imported[kind])
+    
+    def import_meals(self, file):
+        def unique(batch):
+            # One row per member and date, the last one wins, same as the form
+            return list({(meal.user_id, meal.date): meal for meal in batch}.values())
+        
+        def save_batch(batch):
+            existing = {
+                (user_id, day): counts
+                for user_id, day, *counts in MealEntry.objects.filter(
+                    group=self.group,
+                    user_id__in={meal.user_id for meal in batch},
+                    date__in={meal.date for meal in batch},
+                ).values_list('user_id', 'date', *MealEntry.AUDITED)
+            }
+            MealEntry.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['user', 'group', 'date'],
+                update_fields=['breakfast', 'lunch', 'dinner', 'updated_at'],
+            )
+            record(*AuditLog.upserts(batch, existing))
+        
+        self.write('meals', self.read('meals', file, self.parse_meal), save_batch, unique)
+    
+    def import_groceries(self, file):
+        def save_batch(batch):
+            GroceryExpense.objects.bulk_create(batch)
+            record(*(AuditLog.change(grocery, AuditLog.CREATED) for grocery in batch))
+        
+        self.write('groceries', self.read('groceries', file, self.parse_grocery), save_batch)
+    
+    def finish(self, background=False):
+        """
+        bulk_create sends no signals, rebuild the ledger of the group 
+        once for the whole import instead of once per row, in a
+        background task with background on. Call it when an import fails 
+        too, the batches committed before the failure are kept
+        """
+        if self.dry_run or not any(self.imported.values()):
+            return
+        
+        if background:
+            rebuild_ledger.enqueue(group_ids=[self.group.pk])
+        else:
+            MonthlyLedger.rebuild([self.group.pk])
@@ -0,0 +1,198 @@
+"""
+Join code allocation and lookup.
+
+The unique constraint on Group.join_code is the only check of a new code:
+a group is inserted with a candidate code inside a savepoint and a taken
+code is retried with the next candidate, so there is no existence query
+per attempt and two concurrent creates can't end up with one code.
+
+Codes are resolved to their group through an in-process LRU in front of
+the shared cache, unknown codes are cached too
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from collections import OrderedDict
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# 6 hex characters
+CODE_LENGTH = 6
+CODE_SPACE = 16 ** CODE_LENGTH
+
+# max_length of Group.join_code, codes set by hand can be longer
+MAX_CODE_LENGTH = 7
+
+# Halves of the code space for the permutation, 12 bits each
+HALF_BITS = CODE_SPACE.bit_length() // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+FEISTEL_ROUNDS = 4
+
+COUNTER_KEY = 'join-code-counter'
+
+
+def format_code(number: int) -> str:
+    return f'{number:0{CODE_LENGTH}X}'
+
+
+def random_codes():
+    """Codes picked at random from the whole code space"""
+    while True:
+        yield format_code(secrets.randbelow(CODE_SPACE))
+
+
+def permute(index: int) -> int:
+    """
+    Keyed permutation of the code space (a Feistel network over its two
+    halves), every index below CODE_SPACE maps to a different code and the
+    codes of consecutive indexes look unrelated without the key
+    """
+    key = hashlib.sha256(f'join-code:{settings.SECRET_KEY}'.encode()).digest()
+    left, right = index >> HALF_BITS, index & HALF_MASK
+    
+    for round_ in range(FEISTEL_ROUNDS):
+        digest = hmac.new(key, bytes([round_]) + right.to_bytes(2, 'big'), hashlib.sha256).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:2], 'big') & HALF_MASK)
+    
+    return (left << HALF_BITS) | right
+
+
+def permuted_codes():
+    """
+    Codes of a counter shared through the cache walked through permute(),
+    collision free until the whole code space is used. The counter starts
+    at a random index, and moves to another one when its codes turn out
+    to be taken (cache cleared, or not shared between processes)
+    """
+    while True:
+        try:
+            index = cache.incr(COUNTER_KEY)
+        except ValueError:
+            cache.add(COUNTER_KEY, secrets.randbelow(CODE_SPACE))
+            continue
+        yield format_code(permute(index % CODE_SPACE))
+
+
+def reseed_counter():
+    cache.set(COUNTER_KEY, secrets.randbelow(CODE_SPACE), timeout=None)
+
+
+ALLOCATORS = {
+    'random': random_codes,
+    'permutation': permuted_codes,
+}
+
+
+def save_with_join_code(group, save):
+    """
+    Save a new group with a free join code
+    Args:
+        save: the model's save, with its arguments bound
+    Raises the IntegrityError of the last attempt when all of
+    settings.JOIN_CODE_ATTEMPTS codes are taken
+    """
+    allocator = settings.JOIN_CODE_ALLOCATOR
+    codes = ALLOCATORS[allocator]()
+    
+    for attempt in range(settings.JOIN_CODE_ATTEMPTS):
+        group.join_code = next(codes)
+        try:
+            # Savepoint, a failed insert doesn't break the caller's transaction
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            # Only a taken code is retried, not e.g. an admin who already has a group
+            if not type(group)._default_manager.filter(join_code=group.join_code).exists():
+                raise
+            if attempt == settings.JOIN_CODE_ATTEMPTS - 1:
+                raise
+            
+            logger.debug('Join code %s taken, retrying', group.join_code)
+            if allocator == 'permutation':
+                reseed_counter()
+
+
+class LRUCache:
+    """Thread-safe dict of at most maxsize entries, each kept for timeout seconds"""
+    
+    def __init__(self, maxsize: int, timeout: float):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            
+            self.entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+    
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+# Other processes don't see the invalidation of this one, entries are kept briefly
+_resolved = LRUCache(settings.JOIN_CODE_LRU_SIZE, settings.JOIN_CODE_LRU_TIMEOUT)
+
+
+def join_code_key(code: str) -> str:
+    return f'join-code:{code}'
+
+
+def resolve_join_code(code: str):
+    """
+    Group of a join code, from the in-process LRU, then the shared cache,
+    then the database, the result cached on the way back
+    Return:
+        (group id, group name), or None when no group has the code
+    """
+    # Nothing a code can't be is looked up, or made a cache key
+    if not code or not code.isalnum() or len(code) > MAX_CODE_LENGTH:
+        return None
+    key = join_code_key(code)
+    
+    # A miss is cached as an empty tuple, None is "not cached"
+    group = _resolved.get(key)
+    if group is None:
+        group = cache.get(key)
+        
+        if group is None:
+            Group = apps.get_model('app', 'Group')
+            group = Group.objects.filter(join_code=code).values_list('pk', 'name').first() or ()
+            timeout = settings.JOIN_CODE_CACHE_TIMEOUT if group else settings.JOIN_CODE_MISS_TIMEOUT
+            cache.set(key, group, timeout=timeout)
+        
+        _resolved.set(key, group)
+    
+    return group or None
+
+
+def forget_join_code(code: str):
+    """Drop a cached join code, when its group is created, changed or deleted"""
+    key = join_code_key(code)
+    _resolved.delete(key)
+    cache.delete(key)
@@ -0,0 +1,72 @@
+"""
+Email backend queueing the messages as tasks, so a slow SMTP server
+doesn't hold up the request that sends them (e.g. the password reset).
+The worker delivers them through settings.EMAIL_DELIVERY_BACKEND
+"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+import base64
+
+from app.tasks import task
+
+
+def message_to_dict(message) -> dict:
+    """JSON-able fields of an EmailMessage, attachments base64 encoded"""
+    attachments = []
+    for attachment in message.attachments:
+        # MIMEBase attachments can't be rebuilt from JSON, nothing in the app sends them
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append([filename, base64.b64encode(content).decode(), mimetype])
+    
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': message.extra_headers,
+        'content_subtype': message.content_subtype,
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'attachments': attachments,
+    }
+
+
+def message_from_dict(data: dict) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=data['subject'],
+        body=data['body'],
+        from_email=data['from_email'],
+        to=data['to'],
+        cc=data['cc'],
+        bcc=data['bcc'],
+        reply_to=data['reply_to'],
+        headers=data['headers'],
+        alternatives=[tuple(alternative) for alternative in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+
+# The body of a password reset holds a live reset link, not kept once sent
+@task(clear_kwargs=True)
+def send_email(message: dict) -> dict:
+    """Deliver a queued message, raises (and is retried) when the server fails"""
+    with get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=False) as connection:
+        sent = connection.send_messages([message_from_dict(message)])
+    return {'sent': sent}
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Queues a send_email task per message, delivered by the run_tasks worker"""
+    
+    def send_messages(self, email_messages) -> int:
+        for message in email_messages:
+            send_email.enqueue(message=message_to_dict(message))
+        return len(email_messages)
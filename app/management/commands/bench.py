@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+import json
+
+from benchmarks.seed import seed_data
+from benchmarks.views import run_views, explain_month_queries
+from benchmarks.concurrency import run_throughput
+from benchmarks.signup import run_signups
+from benchmarks.join_codes import run_group_creates
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic data in a throwaway test database and benchmark the views"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=2)
+        parser.add_argument('--members', type=int, default=10, help="Members per group")
+        parser.add_argument('--days', type=int, default=90, help="Days of meals per member")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=20, help="Requests per view")
+        parser.add_argument('--warm-cache', action='store_true', help="Don't clear the cache between requests")
+        parser.add_argument('--throughput', action='store_true', help="Compare WSGI and ASGI throughput under concurrent clients")
+        parser.add_argument('--clients', type=int, default=200, help="Concurrent clients of the throughput run")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per view of the throughput run")
+        parser.add_argument('--signups', type=int, default=0, help="Sign-ups and logins per password hasher, 0 to skip")
+        parser.add_argument('--group-creates', type=int, default=0, help="Groups created concurrently (--clients at once) per join code allocator, 0 to skip")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+    
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+    
+    def run(self, options) -> dict:
+        groups = seed_data(options['groups'], options['members'], options['days'], options['seed'])
+        group = groups[0]
+        
+        results = {
+            'database': connection.vendor,
+            'config': {
+                key: options[key] 
+                for key in ['groups', 'members', 'days', 'seed', 'iterations', 'warm_cache']
+            },
+            'views': run_views(group, options['iterations'], options['warm_cache']),
+            'explain': explain_month_queries(group),
+        }
+        
+        if options['throughput']:
+            results['throughput'] = {
+                'clients': options['clients'],
+                'views': run_throughput(group, options['clients'], options['requests']),
+            }
+        
+        if options['signups']:
+            results['signups'] = run_signups(options['signups'])
+        
+        if options['group_creates']:
+            results['group_creates'] = {
+                'clients': options['clients'],
+                'allocators': run_group_creates(options['group_creates'], options['clients']),
+            }
+        return results
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import date
+import shutil
+
+from app.exports import export_sections, stream_csv, write_xlsx
+from app.models import Group
+from app.utils import month_range
+
+
+class Command(BaseCommand):
+    help = "Export meals, groceries and settlement of a group as CSV (or XLSX)"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('group', type=int, help="Group id")
+        parser.add_argument('--month', help="YYYY-MM, current month by default")
+        parser.add_argument('--all', action='store_true', help="Whole history instead of a month")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', help="File to write, stdout by default (CSV only)")
+    
+    def handle(self, *args, **options):
+        try:
+            group = Group.objects.get(pk=options['group'])
+        except Group.DoesNotExist:
+            raise CommandError(f"Group {options['group']} does not exist")
+        
+        if options['all']:
+            start, end = None, None
+        else:
+            try:
+                month = date.fromisoformat(f"{options['month']}-01") if options['month'] else date.today()
+            except ValueError:
+                raise CommandError("--month must be YYYY-MM")
+            start, end = month_range(month.year, month.month)
+        
+        sections = export_sections(group, start, end)
+        
+        if options['format'] == 'xlsx':
+            if not options['output']:
+                raise CommandError("--output is required for XLSX")
+            try:
+                workbook = write_xlsx(sections)
+            except ImportError:
+                raise CommandError("XLSX export needs openpyxl, pip install openpyxl")
+            
+            with workbook, open(options['output'], 'wb') as file:
+                shutil.copyfileobj(workbook, file)
+        
+        elif options['output']:
+            with open(options['output'], 'w', newline='') as file:
+                file.writelines(stream_csv(sections))
+        else:
+            for line in stream_csv(sections):
+                self.stdout.write(line, ending='')
+        
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported to {options['output']}"))
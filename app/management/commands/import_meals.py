@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.imports import CsvImport, IMPORT_BATCH_SIZE
+from app.models import Group
+
+
+class Command(BaseCommand):
+    help = "Import historical meals and groceries of a group from CSV files"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('group', type=int, help="Group id")
+        parser.add_argument('--meals', help="CSV with Date, Phone, Breakfast, Lunch, Dinner")
+        parser.add_argument('--groceries', help="CSV with Date, Phone, Item, Quantity, Cost")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing")
+    
+    def handle(self, *args, **options):
+        try:
+            group = Group.objects.get(pk=options['group'])
+        except Group.DoesNotExist:
+            raise CommandError(f"Group {options['group']} does not exist")
+        
+        if not options['meals'] and not options['groceries']:
+            raise CommandError("Give --meals and/or --groceries")
+        
+        def progress(kind, done):
+            self.stdout.write(f"{kind}: {done} rows", ending='\r')
+            self.stdout.flush()
+        
+        importer = CsvImport(
+            group, 
+            dry_run=options['dry_run'], 
+            batch_size=options['batch_size'], 
+            progress=progress
+        )
+        
+        try:
+            for kind, run in [('meals', importer.import_meals), ('groceries', importer.import_groceries)]:
+                if options[kind]:
+                    with open(options[kind], newline='', encoding='utf-8-sig') as file:
+                        run(file)
+                    self.stdout.write('')
+        finally:
+            # The batches written before a failure are kept, rebuild their figures too
+            importer.finish()
+        
+        for kind, line, message in importer.errors:
+            self.stderr.write(f"{kind} line {line}: {message}")
+        
+        action = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {importer.imported['meals']} meals, {importer.imported['groceries']} groceries, "
+            f"skipped {len(importer.errors)} invalid rows"
+        ))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import date
+
+from app.models import Group, MonthlyLedger
+from app.tasks import rebuild_ledger, recalculate_month
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly ledger from meal and grocery entries, then check it against them"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group', type=int, action='append', dest='groups',
+            help="Only this group id, can be repeated"
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only check the stored ledger, don't rebuild"
+        )
+        parser.add_argument(
+            '--month',
+            help="YYYY-MM, only recalculate this month of the groups, e.g. once it's over"
+        )
+        parser.add_argument(
+            '--queue', action='store_true',
+            help="Queue the rebuild for the run_tasks worker instead of running it here"
+        )
+    
+    def handle(self, *args, **options):
+        groups = options['groups']
+        
+        if options['month']:
+            try:
+                month = date.fromisoformat(f"{options['month']}-01")
+            except ValueError:
+                raise CommandError("--month must be YYYY-MM")
+            
+            group_ids = groups or list(Group.objects.values_list('pk', flat=True))
+            for group_id in group_ids:
+                if options['queue']:
+                    recalculate_month.enqueue(group_id=group_id, year=month.year, month=month.month)
+                else:
+                    recalculate_month(group_id, month.year, month.month)
+            
+            action = "Queued" if options['queue'] else "Recalculated"
+            self.stdout.write(self.style.SUCCESS(f"{action} {month:%Y-%m} of {len(group_ids)} groups"))
+            return
+        
+        if options['queue']:
+            rebuild_ledger.enqueue(group_ids=groups)
+            self.stdout.write(self.style.SUCCESS("Ledger rebuild queued"))
+            return
+        
+        if not options['check']:
+            count = MonthlyLedger.rebuild(groups)
+            self.stdout.write(f"Rebuilt {count} ledger rows")
+        
+        mismatches = MonthlyLedger.verify(groups)
+        
+        for (group_id, user_id, year, month), stored, expected in mismatches:
+            self.stderr.write(
+                f"group={group_id} user={user_id} {year}-{month:02d}: "
+                f"stored={stored} expected={expected}"
+            )
+        
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} ledger rows don't match the entries")
+        
+        self.stdout.write(self.style.SUCCESS("Ledger matches the meal and grocery entries"))
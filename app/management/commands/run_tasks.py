@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import time
+
+from app.tasks import run_due
+
+
+class Command(BaseCommand):
+    help = "Run the queued background tasks (emails, ledger rebuilds, exports), polling for new ones"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between polls when idle")
+        parser.add_argument('--batch', type=int, default=20, help="Tasks picked per poll")
+        parser.add_argument('--once', action='store_true', help="Run the due tasks and exit")
+    
+    def handle(self, *args, **options):
+        total = 0
+        
+        try:
+            while True:
+                # A long running process, the connection may have been dropped in between
+                close_old_connections()
+                count = run_due(options['batch'])
+                total += count
+                
+                if options['once'] and not count:
+                    break
+                if not count:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} tasks"))
@@ -0,0 +1,298 @@
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.db import connection
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+from contextvars import ContextVar
+import heapq
+import json
+import logging
+import time
+from datetime import date
+
+from app.audit import current_actor
+from app.hashers import start_rehash
+from app.models import reopened_months
+
+
+logger = logging.getLogger('app.requests')
+
+# Stats of the request being handled, for the template timing
+current_stats = ContextVar('request_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    """SQL queries and template render time of a single request"""
+    
+    def __init__(self):
+        self.queries = []   # (duration in ms, sql)
+        self.template_ms = 0.0
+    
+    def record_query(self, execute, sql, params, many, context):
+        """Database execute wrapper, times every statement"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(((time.perf_counter() - start) * 1000, sql))
+    
+    @property
+    def db_ms(self):
+        return sum(duration for duration, _ in self.queries)
+    
+    def slowest(self, count):
+        return [
+            {'ms': round(duration, 2), 'sql': sql[:200]} 
+            for duration, sql in heapq.nlargest(count, self.queries, key=lambda query: query[0])
+        ]
+
+
+class TimedTemplate(Template):
+    """Django template adding its render time to the current request stats"""
+    
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats = current_stats.get()
+            if stats:
+                stats.template_ms += (time.perf_counter() - start) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report their render time"""
+    
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+    
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class QueryBudgetMiddleware:
+    """
+    Record the number of SQL queries, DB time, template render time and the 
+    slowest statements of every request. Adds them as a Server-Timing header,
+    logs them as a JSON line and warns (or raises, for tests) when a view 
+    goes over its query budget in settings.QUERY_BUDGETS
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        
+        try:
+            with connection.execute_wrapper(stats.record_query):
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        
+        return self.finish(request, response, stats, start)
+    
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        
+        # The ORM runs in the request's sync thread (sync_to_async is thread 
+        # sensitive), the wrapper goes on the connection of that thread
+        await sync_to_async(lambda: connection.execute_wrappers.append(stats.record_query))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(stats.record_query))()
+            current_stats.reset(token)
+        
+        return self.finish(request, response, stats, start)
+    
+    def finish(self, request, response, stats, start):
+        """Add the header, log the stats and check the query budget"""
+        total_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        view = match.url_name if match else None
+        
+        if settings.QUERY_STATS_HEADER:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_ms:.1f};desc="{len(stats.queries)} queries"',
+                f'tpl;dur={stats.template_ms:.1f}',
+                f'total;dur={total_ms:.1f}',
+            ])
+        
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(stats.queries),
+            'db_ms': round(stats.db_ms, 2),
+            'template_ms': round(stats.template_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'slowest': stats.slowest(settings.QUERY_STATS_SLOWEST),
+        }))
+        
+        budget = settings.QUERY_BUDGETS.get((view, request.method), settings.QUERY_BUDGETS.get(view))
+        if budget is not None and len(stats.queries) > budget:
+            message = f"{view} ran {len(stats.queries)} queries, budget is {budget}"
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        
+        return response
+
+
+class MembershipMiddleware:
+    """
+    Attach the group membership and group of the logged in user to the 
+    request, as request.membership and request.group (None without a group).
+    Loaded along with the user by app.backends.MembershipBackend, in one query.
+    The user is also the actor of the AuditLog rows of the request
+    """
+    sync_capable = True
+    async_capable = True
+    
+    # Sessions logged in before MembershipBackend, moved over on their next request
+    OLD_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+    NEW_BACKEND = 'app.backends.MembershipBackend'
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        self.move_session(request)
+        self.attach(request, request.user)
+        
+        token = current_actor.set(request.user.pk)
+        try:
+            return self.get_response(request)
+        finally:
+            current_actor.reset(token)
+    
+    async def __acall__(self, request):
+        await sync_to_async(self.move_session)(request)
+        
+        # Same user for request.user, it would load it again otherwise
+        request.user = await request.auser()
+        self.attach(request, request.user)
+        
+        # sync_to_async runs the views' ORM calls in a copy of this context
+        token = current_actor.set(request.user.pk)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_actor.reset(token)
+    
+    def move_session(self, request):
+        if request.session.get(BACKEND_SESSION_KEY) == self.OLD_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = self.NEW_BACKEND
+    
+    @staticmethod
+    def attach(request, user):
+        # Cached by the select_related of the backend, no query here
+        request.membership = getattr(user, 'group_membership', None)
+        request.group = request.membership.group if request.membership else None
+
+
+class PasswordRehashMiddleware:
+    """
+    Start the background password rehash of a login (app.hashers.rehash_later)
+    once the response is ready. Goes before SessionMiddleware, so the session
+    of the login is saved by then and can't overwrite the rehash's update of it
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        try:
+            return self.get_response(request)
+        finally:
+            start_rehash(request)
+    
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            start_rehash(request)
+
+
+class ReopenedMonthsMiddleware:
+    """
+    Tell the user when a change of the request reopened a month the group 
+    admin had closed (MonthSnapshot.open_months), its snapshot is gone and 
+    the admin has to close it again. Goes after MessageMiddleware
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        reopened = set()
+        token = reopened_months.set(reopened)
+        try:
+            response = self.get_response(request)
+        finally:
+            reopened_months.reset(token)
+        
+        self.notify(request, reopened)
+        return response
+    
+    async def __acall__(self, request):
+        # The views' ORM calls run in a copy of this context, with the same set
+        reopened = set()
+        token = reopened_months.set(reopened)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reopened_months.reset(token)
+        
+        self.notify(request, reopened)
+        return response
+    
+    @staticmethod
+    def notify(request, reopened):
+        for year, month in sorted(reopened):
+            messages.warning(
+                request, f"{date(year, month, 1):%B %Y} was closed, the change reopened it. "
+                "The group admin can close it again"
+            )
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('breakfast', models.IntegerField(default=0)),
+                ('lunch', models.IntegerField(default=0)),
+                ('dinner', models.IntegerField(default=0)),
+                ('total_meals', models.IntegerField(default=0)),
+                ('spent', models.IntegerField(default=0)),
+                ('cost', models.IntegerField(default=0)),
+                ('balance', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledgers', to='app.group')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledgers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'year', 'month'], name='app_monthly_group_i_50d1ef_idx')],
+                'unique_together': {('group', 'user', 'year', 'month')},
+            },
+        ),
+    ]
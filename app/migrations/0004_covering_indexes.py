@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_archived_entries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='mealentry',
+            name='app_mealent_group_i_89a65a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='groceryexpense',
+            index=models.Index(fields=['group', 'user', 'date'], include=('cost',), name='grocery_group_user_date_cover'),
+        ),
+        migrations.AddIndex(
+            model_name='mealentry',
+            index=models.Index(fields=['group', 'date'], include=('user', 'breakfast', 'lunch', 'dinner'), name='mealentry_group_date_cover'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:49
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_covering_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='mealentry',
+            name='mealentry_group_date_cover',
+        ),
+        migrations.AddField(
+            model_name='mealentry',
+            name='total',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('breakfast'), '+', models.F('lunch')), '+', models.F('dinner')), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='mealentry',
+            index=models.Index(fields=['group', 'date'], include=('user', 'breakfast', 'lunch', 'dinner', 'total'), name='mealentry_group_date_cover'),
+        ),
+    ]
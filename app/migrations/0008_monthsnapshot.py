@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('total_meals', models.IntegerField()),
+                ('total_expenses', models.IntegerField()),
+                ('cost_per_meal', models.FloatField()),
+                ('members', models.JSONField(help_text='MonthlyLedger figures of every member, by user id')),
+                ('locked', models.BooleanField(default=False)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='app.group')),
+            ],
+            options={
+                'unique_together': {('group', 'year', 'month')},
+            },
+        ),
+    ]
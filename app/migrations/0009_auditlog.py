@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_monthsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Meal'), (2, 'Grocery')])),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'Created'), (2, 'Updated'), (3, 'Deleted')])),
+                ('entry_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('date', models.DateField(help_text='Date of the entry')),
+                ('meals', models.PositiveIntegerField(blank=True, help_text='Old and new meal counts, packed by app.audit.pack_meals', null=True)),
+                ('old_cost', models.IntegerField(blank=True, null=True)),
+                ('new_cost', models.IntegerField(blank=True, null=True)),
+                ('item_name', models.CharField(blank=True, max_length=200)),
+                ('changes', models.JSONField(blank=True, help_text='Other grocery fields changed, {field: [old, new]}', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_logs', to='app.group')),
+                ('user', models.ForeignKey(blank=True, help_text='Member the entry belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['group', '-id'], name='auditlog_group_timeline')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Build the MonthlyLedger of the meals and groceries saved before it existed,
+    with the logic of MonthlyLedger.rebuild(), a group at a time
+    """
+    from app.cache import bump_summary_version
+    from app.models import MonthlyLedger as CurrentLedger
+    
+    Group = apps.get_model('app', 'Group')
+    MealEntry = apps.get_model('app', 'MealEntry')
+    GroceryExpense = apps.get_model('app', 'GroceryExpense')
+    MonthlyLedger = apps.get_model('app', 'MonthlyLedger')
+    
+    for group_id in list(Group.objects.values_list('pk', flat=True)):
+        ledgers = MonthlyLedger.objects.filter(group_id=group_id)
+        rows = CurrentLedger.from_raw(
+            MealEntry.objects.filter(group_id=group_id),
+            GroceryExpense.objects.filter(group_id=group_id),
+            model=MonthlyLedger,
+        )
+        
+        months = set(ledgers.values_list('year', 'month').distinct())
+        months.update((year, month) for _, _, year, month in rows)
+        
+        ledgers.delete()
+        MonthlyLedger.objects.bulk_create(rows.values(), batch_size=500)
+        
+        # Summaries cached from the empty ledger
+        for year, month in months:
+            bump_summary_version(group_id, year, month)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_auditlog'),
+    ]
+    
+    operations = [
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
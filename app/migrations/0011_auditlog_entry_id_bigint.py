@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_backfill_monthlyledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='entry_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,25 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-import secrets
+from django.conf import settings
+from contextvars import ContextVar
+from datetime import date
+from itertools import islice
+import functools
+
+from app.utils import calc_cost_per_meal, is_past_month, month_range
+from app.cache import bump_summary_version
+from app.join_codes import save_with_join_code, forget_join_code
+from app.audit import current_actor, pack_meals, record, unpack_meals
+
+
+ARCHIVE_BATCH_SIZE = 1000
+
+# Set of the (year, month) a change of the request reopened, filled by 
+# MonthSnapshot.open_months and told to the user by ReopenedMonthsMiddleware
+reopened_months = ContextVar('reopened_months', default=None)
 
 
 class Group(models.Model):
@@ -12,17 +30,10 @@ class Group(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def save(self, *args, **kwargs):
-        if not self.join_code:
-            # Generate a unique 6-character join code
-            self.join_code = self.generate_join_code()
-        super().save(*args, **kwargs)
-    
-    def generate_join_code(self):
-        """Generate a random 6-character join code"""
-        while True:
-            code = secrets.token_hex(3).upper()  # 6 characters
-            if not Group.objects.filter(join_code=code).exists():
-                return code
+        if self.join_code:
+            return super().save(*args, **kwargs)
+        # Generate a unique 6-character join code
+        return save_with_join_code(self, lambda: super(Group, self).save(*args, **kwargs))
     
     def __str__(self):
         return self.name
@@ -43,7 +54,32 @@ class GroupMember(models.Model):
         return f"{self.user.username} - {self.group.name} ({self.role})"
 
 
-class MealEntry(models.Model):
+class Audited:
+    """
+    Keeps the AUDITED fields of a row as loaded from the database, 
+    the old values of the AuditLog when it's saved
+    """
+    AUDITED = []
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_values()
+        return instance
+    
+    def remember_values(self):
+        # Deferred fields aren't loaded, not read here either
+        self._loaded_values = {field: self.__dict__.get(field) for field in self.AUDITED}
+    
+    def changed_values(self) -> dict:
+        """Old values of the AUDITED fields changed since loaded, None when not loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {field: value for field, value in loaded.items() if getattr(self, field) != value}
+
+
+class MealEntry(Audited, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_entries')
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='meal_entries')
     date = models.DateField()
@@ -61,27 +97,45 @@ class MealEntry(models.Model):
         help_text="Number of dinner meals (0=absent, 1=present, 2+=with guests)"
     )
     
+    # Total meals for the day, computed and stored by the database
+    total = models.GeneratedField(
+        expression=F('breakfast') + F('lunch') + F('dinner'),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    AUDITED = ['breakfast', 'lunch', 'dinner']
+    
     class Meta:
         unique_together = ['user', 'group', 'date']
         ordering = ['-date', 'user']
         indexes = [
             models.Index(fields=['user', 'date']),
-            models.Index(fields=['group', 'date']),
+            # Covers the monthly summaries without reading the table (PostgreSQL)
+            models.Index(
+                fields=['group', 'date'], 
+                include=['user', 'breakfast', 'lunch', 'dinner', 'total'],
+                name='mealentry_group_date_cover',
+            ),
         ]
     
-    @property
-    def total(self):
-        """Calculate total meals for the day"""
-        return self.breakfast + self.lunch + self.dinner
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        super().save(*args, **kwargs)
+        
+        # Inserts get total back from the database, updates don't. 
+        # Defer it so it's loaded again on the next access
+        if updating:
+            self.__dict__.pop('total', None)
     
     def __str__(self):
         return f"{self.user.username} - {self.date} - {self.total} meals"
 
 
-class GroceryExpense(models.Model):
+class GroceryExpense(Audited, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grocery_expenses')
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='grocery_expenses')
     
@@ -93,21 +147,640 @@ class GroceryExpense(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    AUDITED = ['item_name', 'quantity', 'cost']
+    
     class Meta:
         ordering = ['-date', '-created_at']
         indexes = [
             models.Index(fields=['user', 'date']),
             models.Index(fields=['group', 'date']),
+            # Covers the monthly spending of members without reading the table (PostgreSQL)
+            models.Index(
+                fields=['group', 'user', 'date'], 
+                include=['cost'],
+                name='grocery_group_user_date_cover',
+            ),
         ]
     
     def __str__(self):
         return f"{self.user.username} - {self.item_name} - Tk{self.cost}"
 
 
+class MonthlyLedger(models.Model):
+    """
+    Monthly meal counts, spending, cost and balance of a member,
+    kept up to date from the MealEntry and GroceryExpense signals
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='ledgers')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledgers')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    
+    breakfast = models.IntegerField(default=0)
+    lunch = models.IntegerField(default=0)
+    dinner = models.IntegerField(default=0)
+    total_meals = models.IntegerField(default=0)
+    spent = models.IntegerField(default=0)
+    cost = models.IntegerField(default=0)
+    balance = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTS = ['breakfast', 'lunch', 'dinner', 'total_meals', 'spent']
+    FIGURES = COUNTS + ['cost', 'balance']
+    
+    class Meta:
+        unique_together = ['group', 'user', 'year', 'month']
+        indexes = [
+            models.Index(fields=['group', 'year', 'month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.year}-{self.month:02d} - {self.balance}"
+    
+    @classmethod
+    def from_raw(cls, meals, groceries, model=None) -> dict:
+        """
+        Build (unsaved) ledger rows from MealEntry and GroceryExpense querysets,
+        keyed by (group_id, user_id, year, month). Cost and balance are settled too
+        Args:
+            model: class of the rows, the historical model in a migration
+        """
+        model = model or cls
+        rows = {}
+        
+        def row(key):
+            if key not in rows:
+                group_id, user_id, year, month = key
+                rows[key] = model(group_id=group_id, user_id=user_id, year=year, month=month)
+            return rows[key]
+        
+        # order_by() clears the model ordering, otherwise it ends up in GROUP BY
+        meal_totals = meals.order_by().values_list(
+            'group', 'user', ExtractYear('date'), ExtractMonth('date')
+        ).annotate(Sum('breakfast'), Sum('lunch'), Sum('dinner'), Sum('total'))
+        
+        for *key, breakfast, lunch, dinner, total in meal_totals:
+            ledger = row(tuple(key))
+            ledger.breakfast, ledger.lunch, ledger.dinner = breakfast, lunch, dinner
+            ledger.total_meals = total
+        
+        spent_totals = groceries.order_by().values_list(
+            'group', 'user', ExtractYear('date'), ExtractMonth('date')
+        ).annotate(Sum('cost'))
+        
+        for *key, spent in spent_totals:
+            row(tuple(key)).spent = spent
+        
+        months = {}
+        for (group_id, _, year, month), ledger in rows.items():
+            months.setdefault((group_id, year, month), []).append(ledger)
+        for ledgers in months.values():
+            cls.settle(ledgers)
+        
+        return rows
+    
+    @staticmethod
+    def settle(ledgers):
+        """Set cost and balance of all the ledger rows of a group-month"""
+        total_meals = sum(ledger.total_meals for ledger in ledgers)
+        total_expenses = sum(ledger.spent for ledger in ledgers)
+        cost_per_meal = calc_cost_per_meal(total_expenses, total_meals)
+        
+        for ledger in ledgers:
+            total_cost = ledger.total_meals * cost_per_meal
+            ledger.cost = round(total_cost)
+            ledger.balance = round(ledger.spent - total_cost)
+    
+    @classmethod
+    def refresh(cls, group_id, user_id, day):
+        """
+        Recalculate the ledger row of a member for the month of day,
+        then settle cost and balance of every member of that month
+        """
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        year, month = day.year, day.month
+        month_start, month_end = month_range(year, month)
+        
+        with transaction.atomic():
+            fresh = cls.from_raw(
+                MealEntry.objects.filter(
+                    group_id=group_id, user_id=user_id, date__gte=month_start, date__lt=month_end
+                ),
+                GroceryExpense.objects.filter(
+                    group_id=group_id, user_id=user_id, date__gte=month_start, date__lt=month_end
+                ),
+            ).get((group_id, user_id, year, month))
+            
+            if fresh:
+                cls.objects.update_or_create(
+                    group_id=group_id, user_id=user_id, year=year, month=month,
+                    defaults={field: getattr(fresh, field) for field in cls.COUNTS}
+                )
+            else:
+                # No meal or grocery left for the month
+                cls.objects.filter(
+                    group_id=group_id, user_id=user_id, year=year, month=month
+                ).delete()
+            
+            cls.rebalance(group_id, year, month)
+    
+    @classmethod
+    def refresh_month(cls, group_id, day):
+        """Recalculate the ledger rows of every member of a group for the month of day"""
+        year, month = day.year, day.month
+        month_start, month_end = month_range(year, month)
+        
+        rows = cls.from_raw(
+            MealEntry.objects.filter(group_id=group_id, date__gte=month_start, date__lt=month_end),
+            GroceryExpense.objects.filter(group_id=group_id, date__gte=month_start, date__lt=month_end),
+        )
+        
+        with transaction.atomic():
+            cls.objects.filter(group_id=group_id, year=year, month=month).delete()
+            cls.objects.bulk_create(rows.values())
+        
+        bump_summary_version(group_id, year, month)
+    
+    @classmethod
+    def rebalance(cls, group_id, year, month):
+        """Settle cost and balance of a group-month from the stored counts"""
+        ledgers = list(cls.objects.filter(group_id=group_id, year=year, month=month))
+        previous = [(ledger.cost, ledger.balance) for ledger in ledgers]
+        
+        cls.settle(ledgers)
+        
+        changed = [
+            ledger for ledger, figures in zip(ledgers, previous)
+            if (ledger.cost, ledger.balance) != figures
+        ]
+        if changed:
+            cls.objects.bulk_update(changed, ['cost', 'balance'])
+        
+        bump_summary_version(group_id, year, month)
+    
+    @classmethod
+    def rebuild(cls, groups=None) -> int:
+        """Rebuild the ledger of the given groups (all by default) from the raw rows"""
+        meals = MealEntry.objects.all()
+        groceries = GroceryExpense.objects.all()
+        ledgers = cls.objects.all()
+        
+        if groups is not None:
+            meals = meals.filter(group__in=groups)
+            groceries = groceries.filter(group__in=groups)
+            ledgers = ledgers.filter(group__in=groups)
+        
+        rows = cls.from_raw(meals, groceries)
+        
+        months = set(ledgers.values_list('group', 'year', 'month').distinct())
+        months.update((group_id, year, month) for group_id, _, year, month in rows)
+        
+        with transaction.atomic():
+            ledgers.delete()
+            cls.objects.bulk_create(rows.values(), batch_size=500)
+        
+        for group_id, year, month in months:
+            bump_summary_version(group_id, year, month)
+        
+        return len(rows)
+    
+    @classmethod
+    def verify(cls, groups=None) -> list:
+        """
+        Compare the stored ledger against the raw rows
+        Return: list of (key, stored, expected) for every mismatch
+        """
+        meals = MealEntry.objects.all()
+        groceries = GroceryExpense.objects.all()
+        ledgers = cls.objects.all()
+        
+        if groups is not None:
+            meals = meals.filter(group__in=groups)
+            groceries = groceries.filter(group__in=groups)
+            ledgers = ledgers.filter(group__in=groups)
+        
+        expected = cls.from_raw(meals, groceries)
+        stored = {
+            (ledger.group_id, ledger.user_id, ledger.year, ledger.month): ledger 
+            for ledger in ledgers
+        }
+        
+        mismatches = []
+        for key in sorted(expected.keys() | stored.keys()):
+            figures = [
+                tuple(getattr(ledger, field) for field in cls.FIGURES) if ledger else None
+                for ledger in (stored.get(key), expected.get(key))
+            ]
+            if figures[0] != figures[1]:
+                mismatches.append((key, *figures))
+        
+        return mismatches
+
+
+class MonthLocked(Exception):
+    """Change of a meal or grocery in a month the group admin closed and locked"""
+
+
+class MonthSnapshot(models.Model):
+    """
+    Figures of a group-month frozen when the group admin closes it: the 
+    group totals and the MonthlyLedger figures of every member. Never 
+    updated, reopening the month deletes it. Meals and groceries of a 
+    locked month can't be changed, a change in a closed month that isn't
+    locked reopens it
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='snapshots')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    
+    total_meals = models.IntegerField()
+    total_expenses = models.IntegerField()
+    cost_per_meal = models.FloatField()
+    members = models.JSONField(help_text="MonthlyLedger figures of every member, by user id")
+    
+    locked = models.BooleanField(default=False)
+    closed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    closed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        # Its index is the one read of a closed month
+        unique_together = ['group', 'year', 'month']
+    
+    def __str__(self):
+        return f"{self.group.name} - {self.year}-{self.month:02d}{' (locked)' if self.locked else ''}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("A month snapshot can't be changed, reopen the month and close it again")
+        super().save(*args, **kwargs)
+    
+    def ledgers(self) -> dict:
+        """The frozen figures as (unsaved) MonthlyLedger rows, by user id"""
+        return {
+            int(user_id): MonthlyLedger(
+                group_id=self.group_id, user_id=int(user_id), year=self.year, month=self.month, **figures
+            )
+            for user_id, figures in self.members.items()
+        }
+    
+    @classmethod
+    def close(cls, group_id, year, month, closed_by_id=None, locked=False):
+        """
+        Snapshot a group-month from its ledger, recalculated from the raw rows first,
+        run by the app.tasks.close_month task
+        Raises IntegrityError when the month is already closed
+        """
+        with transaction.atomic():
+            MonthlyLedger.refresh_month(group_id, date(year, month, 1))
+            ledgers = list(MonthlyLedger.objects.filter(group_id=group_id, year=year, month=month))
+            
+            total_meals = sum(ledger.total_meals for ledger in ledgers)
+            total_expenses = sum(ledger.spent for ledger in ledgers)
+            snapshot = cls.objects.create(
+                group_id=group_id, year=year, month=month,
+                total_meals=total_meals,
+                total_expenses=total_expenses,
+                cost_per_meal=calc_cost_per_meal(total_expenses, total_meals),
+                members={
+                    ledger.user_id: {field: getattr(ledger, field) for field in MonthlyLedger.FIGURES}
+                    for ledger in ledgers
+                },
+                locked=locked,
+                closed_by_id=closed_by_id,
+            )
+        
+        bump_summary_version(group_id, year, month)
+        return snapshot
+    
+    @classmethod
+    def reopen(cls, group_id, year, month) -> bool:
+        """Drop the snapshot of a group-month, False if it wasn't closed"""
+        deleted, _ = cls.objects.filter(group_id=group_id, year=year, month=month).delete()
+        if deleted:
+            bump_summary_version(group_id, year, month)
+        return bool(deleted)
+    
+    @classmethod
+    def open_months(cls, group_id, days) -> set:
+        """
+        Make the months of days ready for changes: closed ones that aren't
+        locked are reopened, and added to reopened_months. Only past months
+        can be closed, days of the current month need no query
+        Return: set of (year, month) of the locked ones, which can't be changed
+        """
+        months = {(day.year, day.month) for day in days if is_past_month(day.year, day.month)}
+        if not months:
+            return set()
+        
+        closed = [
+            snapshot for snapshot in cls.objects.filter(
+                group_id=group_id, year__in={year for year, _ in months}
+            ).only('pk', 'year', 'month', 'locked')
+            if (snapshot.year, snapshot.month) in months
+        ]
+        
+        reopened = reopened_months.get()
+        for snapshot in closed:
+            if not snapshot.locked and cls.reopen(group_id, snapshot.year, snapshot.month) and reopened is not None:
+                # Not told if the change is rolled back, the month stays closed then
+                transaction.on_commit(functools.partial(reopened.add, (snapshot.year, snapshot.month)))
+        
+        return {(snapshot.year, snapshot.month) for snapshot in closed if snapshot.locked}
+    
+    @classmethod
+    def ensure_open(cls, group_id, day):
+        """open_months(..) of a single day, raises MonthLocked if its month is locked"""
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        
+        if cls.open_months(group_id, [day]):
+            raise MonthLocked(f"{day:%B %Y} is closed and locked by the group admin")
+
+
+class Settlement(models.Model):
+    """A payment from one member to another, settling the balances of a month"""
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='settlements')
+    payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='settlements_paid')
+    payee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='settlements_received')
+    amount = models.PositiveIntegerField()
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    
+    recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['group', 'year', 'month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.payer.username} -> {self.payee.username} - {self.amount} ({self.year}-{self.month:02d})"
+
+
+class ArchivedMealEntry(models.Model):
+    """Meal entries of a member who left the group, kept when archiving is on"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_meal_entries')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='archived_meal_entries')
+    date = models.DateField()
+    
+    breakfast = models.IntegerField(default=0)
+    lunch = models.IntegerField(default=0)
+    dinner = models.IntegerField(default=0)
+    
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    FIELDS = ['user_id', 'group_id', 'date', 'breakfast', 'lunch', 'dinner', 'created_at', 'updated_at']
+    
+    class Meta:
+        ordering = ['-date', 'user']
+        indexes = [
+            models.Index(fields=['group', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.date} (archived)"
+
+
+class ArchivedGroceryExpense(models.Model):
+    """Grocery expenses of a member who left the group, kept when archiving is on"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_grocery_expenses')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='archived_grocery_expenses')
+    
+    date = models.DateField()
+    item_name = models.CharField(max_length=200)
+    quantity = models.CharField(max_length=50, blank=True)
+    cost = models.IntegerField()
+    
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    FIELDS = ['user_id', 'group_id', 'date', 'item_name', 'quantity', 'cost', 'created_at', 'updated_at']
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['group', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.item_name} (archived)"
+
+
+class Task(models.Model):
+    """
+    A queued call of a function registered in app.tasks, run by the 
+    run_tasks worker and retried with backoff when it fails
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    run_at = models.DateTimeField(help_text="Not run before, pushed back on every retry")
+    started_at = models.DateTimeField(null=True, blank=True)
+    
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            # The worker's poll of due tasks
+            models.Index(fields=['status', 'run_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class AuditLog(models.Model):
+    """
+    Append-only history of the meal and grocery changes: who changed 
+    whose entry, from what to what. Rows are written by app.audit.record(..)
+    once the transaction commits, one insert per call (a single change or 
+    every change of a bulk write), and never updated
+    """
+    MEAL = 1
+    GROCERY = 2
+    KIND_CHOICES = [
+        (MEAL, 'Meal'),
+        (GROCERY, 'Grocery'),
+    ]
+    
+    CREATED = 1
+    UPDATED = 2
+    DELETED = 3
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    ]
+    
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='audit_logs')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Member the entry belongs to"
+    )
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    action = models.PositiveSmallIntegerField(choices=ACTION_CHOICES)
+    
+    # Not a foreign key, the entry can be deleted and the log stays
+    entry_id = models.PositiveBigIntegerField(null=True, blank=True)
+    date = models.DateField(help_text="Date of the entry")
+    
+    meals = models.PositiveIntegerField(null=True, blank=True, 
+        help_text="Old and new meal counts, packed by app.audit.pack_meals"
+    )
+    old_cost = models.IntegerField(null=True, blank=True)
+    new_cost = models.IntegerField(null=True, blank=True)
+    item_name = models.CharField(max_length=200, blank=True)
+    changes = models.JSONField(null=True, blank=True, help_text="Other grocery fields changed, {field: [old, new]}")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # The group's activity timeline, paginated on id
+            models.Index(fields=['group', '-id'], name='auditlog_group_timeline'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.get_action_display().lower()} - {self.date} - #{self.entry_id}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Audit log rows can't be changed")
+        super().save(*args, **kwargs)
+    
+    @property
+    def meal_counts(self):
+        """tuple(old, new) (breakfast, lunch, dinner) counts of a meal change"""
+        return unpack_meals(self.meals or 0)
+    
+    @classmethod
+    def change(cls, entry, action, old=None):
+        """
+        Audit row of a change of entry: MealEntry or GroceryExpense, by the current actor
+        Args:
+            old: values of the AUDITED fields before an update, changed ones at least
+        """
+        row = cls(
+            group_id=entry.group_id, actor_id=current_actor.get(), user_id=entry.user_id,
+            action=action, entry_id=entry.pk, date=entry.date,
+        )
+        new = {field: getattr(entry, field) for field in entry.AUDITED}
+        unknown = dict.fromkeys(entry.AUDITED)
+        if action == cls.CREATED:
+            old = unknown
+        elif action == cls.DELETED:
+            old, new = new, unknown
+        else:
+            # Unchanged fields can be left out of old, None when not known at all
+            old = {**new, **old} if old is not None else unknown
+        
+        if isinstance(entry, MealEntry):
+            row.kind = cls.MEAL
+            row.meals = pack_meals(
+                [old[field] or 0 for field in entry.AUDITED], [new[field] or 0 for field in entry.AUDITED]
+            )
+        else:
+            row.kind = cls.GROCERY
+            row.item_name = entry.item_name
+            row.old_cost, row.new_cost = old['cost'], new['cost']
+            if action == cls.UPDATED:
+                row.changes = {
+                    field: [old[field], new[field]] for field in ['item_name', 'quantity'] 
+                    if old[field] != new[field]
+                } or None
+        
+        return row
+    
+    @classmethod
+    def upserts(cls, meals, existing: dict) -> list:
+        """
+        Audit rows of meals written with a bulk_create upsert, none for the unchanged ones
+        Args:
+            existing: {(user_id, date): (breakfast, lunch, dinner)} of the rows before
+        """
+        rows = []
+        for meal in meals:
+            before = existing.get((meal.user_id, meal.date))
+            if before is None:
+                rows.append(cls.change(meal, cls.CREATED))
+            elif tuple(before) != (meal.breakfast, meal.lunch, meal.dinner):
+                rows.append(cls.change(meal, cls.UPDATED, dict(zip(MealEntry.AUDITED, before))))
+        return rows
+
+
+def remove_member_entries(user_id, group_id, archive=False):
+    """
+    Delete the meal and grocery entries of a member in a group set-based,
+    one DELETE per table without the per row signals, after copying them 
+    to the archive tables (optionally) and the AuditLog in batches.
+    The ledger of every month they were in is recalculated once.
+    Raises MonthLocked, and deletes nothing, when one of the months is locked
+    """
+    meals = MealEntry.objects.filter(user_id=user_id, group_id=group_id)
+    groceries = GroceryExpense.objects.filter(user_id=user_id, group_id=group_id)
+    
+    with transaction.atomic():
+        # The pre_delete check of the lock, once per month
+        months = set(MonthlyLedger.objects.filter(user_id=user_id, group_id=group_id).values_list('year', 'month'))
+        for year, month in months:
+            MonthSnapshot.ensure_open(group_id, date(year, month, 1))
+        
+        for queryset, archive_model in [
+            (meals, ArchivedMealEntry), 
+            (groceries, ArchivedGroceryExpense)
+        ]:
+            model = queryset.model
+            fields = ['id', 'group_id', 'user_id', 'date', *model.AUDITED]
+            if archive:
+                fields += [field for field in archive_model.FIELDS if field not in fields]
+            
+            rows = queryset.order_by().values(*fields).iterator(chunk_size=ARCHIVE_BATCH_SIZE)
+            while batch := list(islice(rows, ARCHIVE_BATCH_SIZE)):
+                if archive:
+                    archive_model.objects.bulk_create(
+                        archive_model(**{field: row[field] for field in archive_model.FIELDS}) for row in batch
+                    )
+                # The post_delete logging, from unsaved entries built from the values
+                record(*(AuditLog.change(model(**row), AuditLog.DELETED) for row in batch))
+            
+            # Nothing references the entries, the collector would only run the signals
+            queryset._raw_delete(queryset.db)
+        
+        for year, month in months:
+            MonthlyLedger.refresh_month(group_id, date(year, month, 1))
+
+
 
 # Signals to automatically create/update/delete related records
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 
 @receiver(post_save, sender=Group)
 def create_admin_membership(sender, instance, created, **kwargs):
@@ -119,18 +792,90 @@ def create_admin_membership(sender, instance, created, **kwargs):
             role='admin'
         )
 
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def drop_cached_join_code(sender, instance, **kwargs):
+    """A new group's code may be cached as unknown, a changed or deleted one as its group"""
+    forget_join_code(instance.join_code)
+
+def deleted_by_cascade(origin):
+    """Rows deleted along with their group or user"""
+    model = getattr(origin, 'model', type(origin))
+    return model in (Group, User)
+
+def ledger_skipped(origin):
+    """
+    Rows deleted along with their group or user don't need ledger upkeep,
+    the ledger rows of the group/user are deleted by the same cascade
+    """
+    return deleted_by_cascade(origin)
+
 @receiver(post_delete, sender=GroupMember)
 def leave_group_cleanup(sender, instance, **kwargs):
     """
-    Cleanup meal and grocery entries of the member 
+    Cleanup meal and grocery entries of the member in the group
     when he leave the group
     """
-    user = instance.user
+    # Deleting the group or the user removes the entries anyway
+    if deleted_by_cascade(kwargs.get('origin')):
+        return
+    
+    remove_member_entries(
+        instance.user_id, 
+        instance.group_id, 
+        archive=settings.ARCHIVE_LEFT_MEMBER_ENTRIES
+    )
 
-    if hasattr(user, 'meal_entries'):
-        for meal in user.meal_entries.all():
-            meal.delete()
-            
-    if hasattr(user, 'grocery_expenses'):
-        for grocery in user.grocery_expenses.all():
-            grocery.delete()
+@receiver(pre_save, sender=MealEntry)
+@receiver(pre_save, sender=GroceryExpense)
+def check_month_open(sender, instance, **kwargs):
+    """Changes of a locked month are refused, a closed one is reopened"""
+    MonthSnapshot.ensure_open(instance.group_id, instance.date)
+
+@receiver(pre_delete, sender=MealEntry)
+@receiver(pre_delete, sender=GroceryExpense)
+def check_month_open_on_delete(sender, instance, origin=None, **kwargs):
+    if ledger_skipped(origin):
+        return
+    MonthSnapshot.ensure_open(instance.group_id, instance.date)
+
+@receiver(post_save, sender=MealEntry)
+@receiver(post_save, sender=GroceryExpense)
+def audit_change(sender, instance, created, **kwargs):
+    """Log the change in the AuditLog, nothing for a save that changed no audited field"""
+    if created:
+        record(AuditLog.change(instance, AuditLog.CREATED))
+    else:
+        # Old values are unknown for a row that wasn't loaded from the database
+        changed = instance.changed_values()
+        if changed is None or changed:
+            record(AuditLog.change(instance, AuditLog.UPDATED, changed))
+    
+    instance.remember_values()
+
+@receiver(post_delete, sender=MealEntry)
+@receiver(post_delete, sender=GroceryExpense)
+def audit_delete(sender, instance, origin=None, **kwargs):
+    # The log of the group goes with it, a deleted user's entries are no dispute
+    if deleted_by_cascade(origin):
+        return
+    record(AuditLog.change(instance, AuditLog.DELETED))
+
+@receiver(post_save, sender=Settlement)
+@receiver(post_delete, sender=Settlement)
+def drop_cached_settlements(sender, instance, **kwargs):
+    """The reports carry the settled amounts into the balance of later months"""
+    bump_summary_version(instance.group_id, instance.year, instance.month)
+
+@receiver(post_save, sender=MealEntry)
+@receiver(post_save, sender=GroceryExpense)
+def update_ledger(sender, instance, **kwargs):
+    """Keep the MonthlyLedger of the member in sync with meals and groceries"""
+    MonthlyLedger.refresh(instance.group_id, instance.user_id, instance.date)
+
+@receiver(post_delete, sender=MealEntry)
+@receiver(post_delete, sender=GroceryExpense)
+def update_ledger_on_delete(sender, instance, origin=None, **kwargs):
+    if ledger_skipped(origin):
+        return
+    MonthlyLedger.refresh(instance.group_id, instance.user_id, instance.date)
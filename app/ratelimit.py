@@ -0,0 +1,62 @@
+"""
+Token bucket rate limits kept in Django's cache, shared by the processes
+when the cache is (CACHE_URL). A bucket holds up to `burst` tokens, each
+request takes one and they are refilled at `per_minute` a minute.
+The read and the write of a bucket aren't atomic, concurrent requests of
+one client can get a few more than the limit through, never many more
+"""
+from django.conf import settings
+from django.core.cache import cache
+import math
+import time
+
+
+def take_token(key: str, burst: int, per_minute: float) -> float:
+    """
+    Take a token from the bucket of key
+    Return:
+        0 when allowed, else the seconds until the next token
+    """
+    rate = per_minute / 60
+    now = time.time()
+    
+    tokens, updated = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    
+    if tokens < 1:
+        return (1 - tokens) / rate
+    
+    # Expires once full again, a missing bucket is a full one
+    cache.set(key, (tokens - 1, now), timeout=math.ceil(burst / rate))
+    return 0
+
+
+def client_ip(request) -> str:
+    """
+    Address of the client, from settings.RATE_LIMIT_IP_HEADER (first address
+    of e.g. HTTP_X_FORWARDED_FOR) behind a proxy, else REMOTE_ADDR
+    """
+    if settings.RATE_LIMIT_IP_HEADER:
+        forwarded = request.META.get(settings.RATE_LIMIT_IP_HEADER, '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def rate_limit(request, scope: str) -> float:
+    """
+    Take a token from the buckets of the client's IP and of the logged in
+    user for scope, limits from settings.RATE_LIMITS[scope]
+    Return:
+        0 when allowed, else the seconds to wait
+    """
+    limits = settings.RATE_LIMITS[scope]
+    buckets = [('ip', client_ip(request))]
+    if request.user.is_authenticated:
+        buckets.append(('user', request.user.pk))
+    
+    waits = [
+        take_token(f'rate-limit:{scope}:{kind}:{value}', *limits[kind])
+        for kind, value in buckets
+    ]
+    return max(waits)
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from collections import defaultdict
+from datetime import date
+
+from app.cache import history_version
+from app.models import MonthlyLedger, Settlement
+from app.utils import add_months, calc_cost_per_meal
+
+
+RANGES = ['12m', 'ytd', 'custom']
+
+# Longest custom range, in months
+MAX_REPORT_MONTHS = 120
+
+
+def parse_month(value: str) -> date:
+    """First day of the month of 'yyyy-mm' (or 'yyyy-mm-dd')"""
+    value = (value or '').strip()
+    if len(value) == 7:
+        value += '-01'
+    return date.fromisoformat(value).replace(day=1)
+
+
+def report_months(range_name: str, start: str = None, end: str = None, today: date = None) -> list:
+    """
+    First day of every month of a report range
+    Args:
+        range_name: 12m (last 12 months), ytd (year to date) or custom (start to end, 'yyyy-mm')
+    Raises ValueError for an unknown range or invalid custom months
+    """
+    today = today or date.today()
+    last = today.replace(day=1)
+
+    if range_name == '12m':
+        first = add_months(last, -11)
+    elif range_name == 'ytd':
+        first = last.replace(month=1)
+    elif range_name == 'custom':
+        first, last = parse_month(start), parse_month(end)
+        if first > last:
+            raise ValueError('Start month is after the end month')
+    else:
+        raise ValueError(f'Unknown range {range_name}, expected one of {", ".join(RANGES)}')
+
+    count = (last.year - first.year) * 12 + last.month - first.month + 1
+    if count > MAX_REPORT_MONTHS:
+        raise ValueError(f'At most {MAX_REPORT_MONTHS} months per report')
+
+    return [add_months(first, index) for index in range(count)]
+
+
+def month_filter(first: date, last: date) -> Q:
+    """Ledger rows from the month of first to the month of last"""
+    after_first = Q(year__gt=first.year) | Q(year=first.year, month__gte=first.month)
+    before_last = Q(year__lt=last.year) | Q(year=last.year, month__lte=last.month)
+    return after_first & before_last
+
+
+def settled_amounts(group_id, months: Q) -> dict:
+    """
+    Net amount each member settled in the months, what was paid less what 
+    was received, by (user id, year, month), as outstanding_balances(..) counts it
+    """
+    settled = defaultdict(int)
+    for payer_id, payee_id, year, month, amount in Settlement.objects.filter(months, group_id=group_id).values_list(
+        'payer', 'payee', 'year', 'month', 'amount'
+    ):
+        settled[payer_id, year, month] += amount
+        settled[payee_id, year, month] -= amount
+    return settled
+
+
+def opening_balances(group_id, first: date) -> dict:
+    """
+    Balance carried into the month of first by each member (user id), the
+    sum of the balances of every earlier month less what was settled in them.
+    Cached until any month of the group changes, so a long history is summed 
+    once, not per report
+    """
+    key = f'opening-balances:{group_id}:{first:%Y-%m}:{history_version(group_id)}'
+
+    balances = cache.get(key)
+    if balances is None:
+        earlier = Q(year__lt=first.year) | Q(year=first.year, month__lt=first.month)
+        balances = dict(
+            MonthlyLedger.objects.filter(earlier, group_id=group_id)
+            .order_by().values('user').annotate(Sum('balance'))
+            .values_list('user', 'balance__sum')
+        )
+        for (user_id, _, _), amount in settled_amounts(group_id, earlier).items():
+            balances[user_id] = balances.get(user_id, 0) + amount
+        cache.set(key, balances, timeout=settings.SUMMARY_CACHE_PAST_TIMEOUT)
+
+    return balances
+
+
+def group_report(group, months: list) -> dict:
+    """
+    Monthly series of a group over months (see report_months): group totals
+    and cost per meal, and each member's meals, spending, cost, balance
+    and balance carried forward (less the settlements), from the MonthlyLedger 
+    in one query and the Settlements in another
+    Return:
+        dict(months, group: list of dict, members: dict of list of dict by user id)
+    """
+    ledgers = {
+        (ledger.user_id, ledger.year, ledger.month): ledger
+        for ledger in MonthlyLedger.objects.filter(month_filter(months[0], months[-1]), group=group)
+    }
+    settled = settled_amounts(group.pk, month_filter(months[0], months[-1]))
+    user_ids = sorted(
+        {user_id for user_id, _, _ in [*ledgers, *settled]} | set(group.members.values_list('user_id', flat=True))
+    )
+
+    carried = dict.fromkeys(user_ids, 0)
+    carried.update(opening_balances(group.pk, months[0]))
+
+    group_series = []
+    members = {user_id: [] for user_id in user_ids}
+    empty = MonthlyLedger()
+
+    for month in months:
+        total_meals = total_expenses = 0
+
+        for user_id in user_ids:
+            ledger = ledgers.get((user_id, month.year, month.month), empty)
+            carried[user_id] += ledger.balance + settled.get((user_id, month.year, month.month), 0)
+
+            total_meals += ledger.total_meals
+            total_expenses += ledger.spent
+
+            members[user_id].append({
+                'month': month,
+                'total_meals': ledger.total_meals,
+                'spent': ledger.spent,
+                'cost': ledger.cost,
+                'balance': ledger.balance,
+                'carried': carried[user_id],
+            })
+
+        group_series.append({
+            'month': month,
+            'total_meals': total_meals,
+            'total_expenses': total_expenses,
+            'cost_per_meal': calc_cost_per_meal(total_expenses, total_meals),
+        })
+
+    return {'months': months, 'group': group_series, 'members': members}
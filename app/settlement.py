@@ -0,0 +1,76 @@
+from collections import namedtuple
+from django.db.models import Q, Sum
+import heapq
+
+from app.models import MonthlyLedger, Settlement
+
+
+# A suggested payment between two members, by user id
+Transfer = namedtuple('Transfer', ['payer_id', 'payee_id', 'amount'])
+
+
+def minimal_transfers(balances: dict) -> list:
+    """
+    Payments that bring every balance to zero, greedily matching the largest
+    debtor with the largest creditor, at most n - 1 transfers for n members
+    Args:
+        balances: balance by user id, negative owes the group
+    Return:
+        list of Transfer, largest first
+    """
+    # heapq is a min-heap, amounts are pushed negated to pop the largest first.
+    # user id breaks ties so the result doesn't depend on the dict order
+    debtors = [(balance, user_id) for user_id, balance in balances.items() if balance < 0]
+    creditors = [(-balance, user_id) for user_id, balance in balances.items() if balance > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+    
+    transfers = []
+    # Rounded balances don't always add up to zero, whatever is left over is dropped
+    while debtors and creditors:
+        debt, payer_id = heapq.heappop(debtors)
+        credit, payee_id = heapq.heappop(creditors)
+        amount = min(-debt, -credit)
+        
+        transfers.append(Transfer(payer_id, payee_id, amount))
+        
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, payer_id))
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, payee_id))
+    
+    return transfers
+
+
+def month_settlements(group, year: int, month: int):
+    return Settlement.objects.filter(group=group, year=year, month=month)
+
+
+def outstanding_balances(summary, user_ids, settlements) -> dict:
+    """
+    Balance of each member (user id) from the month summary, less what
+    was already paid (payer) or received (payee) in the settlements
+    """
+    balances = {user_id: summary.member(user_id).balance for user_id in user_ids}
+    
+    for settlement in settlements:
+        if settlement.payer_id in balances:
+            balances[settlement.payer_id] += settlement.amount
+        if settlement.payee_id in balances:
+            balances[settlement.payee_id] -= settlement.amount
+    
+    return balances
+
+
+def member_outstanding(member, year: int, month: int) -> int:
+    """Balance of member: GroupMember left after the recorded settlements of the month"""
+    ledger = MonthlyLedger.objects.filter(
+        group_id=member.group_id, user_id=member.user_id, year=year, month=month
+    ).only('balance').first()
+    
+    totals = month_settlements(member.group_id, year, month).aggregate(
+        paid=Sum('amount', filter=Q(payer_id=member.user_id)),
+        received=Sum('amount', filter=Q(payee_id=member.user_id)),
+    )
+    
+    return (ledger.balance if ledger else 0) + (totals['paid'] or 0) - (totals['received'] or 0)
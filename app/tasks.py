@@ -0,0 +1,169 @@
+"""
+Small database backed task queue.
+
+A function decorated with @task() is queued with func.enqueue(**kwargs),
+as a Task row written in the caller's transaction, and run by the
+`manage.py run_tasks` worker. A run that raises is retried with exponential
+backoff, up to max_attempts runs. Arguments are stored as JSON.
+With TASKS_EAGER on, tasks run in the process right after the commit
+instead, for development without a worker. Finished tasks are deleted
+after TASKS_KEEP_DAYS
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from datetime import date, timedelta
+import functools
+import logging
+import random
+import traceback
+
+from app.models import MonthlyLedger, MonthSnapshot, Task
+
+logger = logging.getLogger(__name__)
+
+
+def task(max_attempts: int = None, clear_kwargs: bool = False):
+    """
+    Make a function queueable, as func.enqueue(delay=0, **kwargs)
+    Args:
+        max_attempts: runs before it's given up, settings.TASKS_MAX_ATTEMPTS by default
+        clear_kwargs: empty the stored kwargs once the task is done or failed,
+            for arguments that shouldn't stay in the database (mail bodies)
+    """
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        func.clear_kwargs = clear_kwargs
+        func.enqueue = functools.partial(enqueue, func)
+        return func
+    return register
+
+
+def enqueue(func, delay: float = 0, **kwargs) -> Task:
+    """Queue a call of the task func with kwargs, run no sooner than delay seconds from now"""
+    queued = Task.objects.create(
+        name=func.task_name,
+        kwargs=kwargs,
+        max_attempts=func.max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    
+    if settings.TASKS_EAGER and not delay:
+        transaction.on_commit(lambda: run(queued))
+    return queued
+
+
+def backoff(attempts: int) -> float:
+    """Seconds before the next run after `attempts` failed ones, doubling with some jitter"""
+    delay = min(settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1), settings.TASKS_RETRY_MAX_DELAY)
+    return delay + random.uniform(0, delay / 10)
+
+
+def claim(queued: Task) -> bool:
+    """Mark a queued task running, False when another worker took it first"""
+    now = timezone.now()
+    claimed = Task.objects.filter(pk=queued.pk, status=Task.QUEUED).update(
+        status=Task.RUNNING, attempts=F('attempts') + 1, started_at=now, updated_at=now
+    )
+    if claimed:
+        queued.status = Task.RUNNING
+        queued.attempts += 1
+        queued.started_at = now
+    return bool(claimed)
+
+
+def run(queued: Task):
+    """Run a queued task, unless another worker claimed it, and record the outcome"""
+    if not claim(queued):
+        return
+    
+    func = None
+    try:
+        func = import_string(queued.name)
+        # Only functions made tasks can be run from a row
+        if getattr(func, 'task_name', None) != queued.name:
+            raise LookupError(f'{queued.name} is not a task')
+        
+        queued.result = func(**queued.kwargs)
+        queued.status = Task.DONE
+        queued.last_error = ''
+    
+    except Exception:
+        queued.last_error = traceback.format_exc()
+        
+        if queued.attempts < queued.max_attempts:
+            queued.status = Task.QUEUED
+            queued.run_at = timezone.now() + timedelta(seconds=backoff(queued.attempts))
+            logger.warning('Task %s #%s failed, retry %d at %s', queued.name, queued.pk, queued.attempts, queued.run_at)
+        else:
+            queued.status = Task.FAILED
+            logger.error('Task %s #%s failed %d times, giving up\n%s', queued.name, queued.pk, queued.attempts, queued.last_error)
+    
+    if queued.status != Task.QUEUED and getattr(func, 'clear_kwargs', False):
+        queued.kwargs = {}
+    
+    queued.save(update_fields=['status', 'kwargs', 'result', 'last_error', 'run_at', 'updated_at'])
+
+
+def requeue_stalled() -> int:
+    """
+    Tasks left running longer than TASKS_TIMEOUT, by a worker that died, are
+    queued again, or failed when that was their last attempt
+    """
+    now = timezone.now()
+    stalled = Task.objects.filter(
+        status=Task.RUNNING, started_at__lt=now - timedelta(seconds=settings.TASKS_TIMEOUT)
+    )
+    
+    requeued = stalled.filter(attempts__lt=F('max_attempts')).update(
+        status=Task.QUEUED, run_at=now, updated_at=now
+    )
+    stalled.update(status=Task.FAILED, last_error='Worker stopped while running', updated_at=now)
+    return requeued
+
+
+def prune_finished() -> int:
+    """Delete the done and failed tasks last changed more than TASKS_KEEP_DAYS ago"""
+    cutoff = timezone.now() - timedelta(days=settings.TASKS_KEEP_DAYS)
+    deleted, _ = Task.objects.filter(status__in=[Task.DONE, Task.FAILED], updated_at__lt=cutoff).delete()
+    return deleted
+
+
+def run_due(limit: int) -> int:
+    """Run up to limit due tasks, oldest first, return how many were picked"""
+    requeue_stalled()
+    prune_finished()
+    
+    due = list(Task.objects.filter(status=Task.QUEUED, run_at__lte=timezone.now())[:limit])
+    for queued in due:
+        run(queued)
+    return len(due)
+
+
+# Tasks
+
+@task()
+def rebuild_ledger(group_ids: list = None) -> dict:
+    """Rebuild the MonthlyLedger of the groups (all by default) from the meals and groceries"""
+    return {'rows': MonthlyLedger.rebuild(group_ids)}
+
+
+@task()
+def recalculate_month(group_id: int, year: int, month: int) -> dict:
+    """Recalculate the ledger of every member of a group-month, once the month is over"""
+    MonthlyLedger.refresh_month(group_id, date(year, month, 1))
+    return {'group': group_id, 'month': f'{year}-{month:02d}'}
+
+
+@task()
+def close_month(group_id: int, year: int, month: int, closed_by_id: int = None, locked: bool = False) -> dict:
+    """Recalculate a group-month and freeze it in a MonthSnapshot, queued by the close_month view"""
+    try:
+        MonthSnapshot.close(group_id, year, month, closed_by_id=closed_by_id, locked=locked)
+    except IntegrityError:
+        # Closed in between, by an earlier task of a double submit
+        return {'closed': False}
+    return {'closed': True}
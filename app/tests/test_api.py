@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from datetime import date
+
+from app.models import Group, MealEntry
+
+
+class SummaryETagTests(TestCase):
+    """The ETags follow the rows in the database, not a per-process cache"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin')
+        cls.group = Group.objects.create(name='Flat', admin=cls.admin)
+    
+    def setUp(self):
+        self.client.force_login(self.admin)
+    
+    def test_etag_changes_with_a_meal(self):
+        url = reverse('api-group-summary')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        
+        MealEntry.objects.create(user=self.admin, group=self.group, date=date.today(), lunch=1)
+        # Another process wouldn't have the bumped cache version either
+        cache.clear()
+        
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase
+from django.test.client import RequestFactory
+from unittest import mock
+import threading
+
+from app import hashers
+
+
+class StartRehashTests(SimpleTestCase):
+    
+    def test_skipped_when_backlog_full(self):
+        request = RequestFactory().post('/login/')
+        request.password_rehash = (1, 'old-hash', 'session-hash', 'session-key', 'secret')
+        
+        full = threading.BoundedSemaphore(1)
+        full.acquire()
+        executor = mock.Mock()
+        with mock.patch.object(hashers, '_backlog', full), mock.patch.object(hashers, '_executor', executor):
+            hashers.start_rehash(request)
+        
+        executor.submit.assert_not_called()
+        self.assertFalse(hasattr(request, 'password_rehash'))
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from datetime import date
+
+from app.models import AuditLog, GroceryExpense, Group, GroupMember, MealEntry, MonthlyLedger
+
+
+class LeaveGroupTests(TestCase):
+    
+    def test_entries_removed_logged_and_ledger_refreshed(self):
+        admin = User.objects.create_user('admin')
+        member = User.objects.create_user('member')
+        group = Group.objects.create(name='Flat', admin=admin)
+        membership = GroupMember.objects.create(user=member, group=group)
+        
+        today = date.today()
+        for user in [admin, member]:
+            MealEntry.objects.create(user=user, group=group, date=today, lunch=1)
+        GroceryExpense.objects.create(user=member, group=group, date=today, item_name='Rice', cost=100)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            membership.delete()
+        
+        self.assertFalse(MealEntry.objects.filter(user=member).exists())
+        self.assertFalse(GroceryExpense.objects.filter(user=member).exists())
+        self.assertEqual(AuditLog.objects.filter(user=member, action=AuditLog.DELETED).count(), 2)
+        
+        ledger = MonthlyLedger.objects.get(group=group)
+        self.assertEqual((ledger.user_id, ledger.total_meals, ledger.spent), (admin.pk, 1, 0))
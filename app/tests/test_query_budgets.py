@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from datetime import date
+
+from app.models import Group, GroupMember, MealEntry
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class TrackMealsBudgetTests(TestCase):
+    """Saving the meals of a date stays within the POST budget of track-meals"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pw')
+        cls.group = Group.objects.create(name='Flat', admin=cls.admin)
+        for index in range(4):
+            user = User.objects.create_user(f'member{index}', password='pw')
+            GroupMember.objects.create(user=user, group=cls.group)
+    
+    def setUp(self):
+        self.client.force_login(self.admin)
+    
+    def post_meals(self, url_name, dinner):
+        data = {'meal_date': date.today().isoformat()}
+        for member in GroupMember.objects.filter(group=self.group):
+            data[f'member_{member.pk}_breakfast'] = 1
+            data[f'member_{member.pk}_lunch'] = 1
+            data[f'member_{member.pk}_dinner'] = dinner
+        return self.client.post(reverse(url_name), data)
+    
+    def test_post_within_budget(self):
+        for url_name in ['track-meals', 'async-track-meals']:
+            with self.subTest(url_name):
+                # Creates the rows, then updates them
+                self.post_meals(url_name, dinner=0)
+                response = self.post_meals(url_name, dinner=1)
+                
+                # Shown by a GET, a refresh doesn't post again
+                self.assertRedirects(response, f'{reverse(url_name)}?date={date.today():%Y-%m-%d}')
+                
+                self.assertEqual(
+                    MealEntry.objects.filter(group=self.group, date=date.today(), dinner=1).count(), 5
+                )
+    
+    def test_get_within_budget(self):
+        for url_name in ['track-meals', 'async-track-meals']:
+            with self.subTest(url_name):
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, 200)
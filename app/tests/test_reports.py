@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from datetime import date
+
+from app.models import GroceryExpense, Group, GroupMember, MealEntry, Settlement
+from app.reports import group_report, report_months
+from app.utils import add_months
+
+
+class GroupReportTests(TestCase):
+    """Balance carried from month to month, less the settlements"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin')
+        cls.member = User.objects.create_user('member')
+        cls.group = Group.objects.create(name='Flat', admin=cls.admin)
+        GroupMember.objects.create(user=cls.member, group=cls.group)
+
+        # Two months ago the admin bought for both, the member owes 50
+        cls.this_month = date.today().replace(day=1)
+        cls.earlier = add_months(cls.this_month, -2)
+        for user in [cls.admin, cls.member]:
+            MealEntry.objects.create(user=user, group=cls.group, date=cls.earlier, lunch=1)
+        GroceryExpense.objects.create(user=cls.admin, group=cls.group, date=cls.earlier, item_name='Rice', cost=100)
+
+    def setUp(self):
+        # Cached opening balances of another test's group with the same id
+        cache.clear()
+
+    def carried(self, months):
+        members = group_report(self.group, months)['members']
+        return [row['carried'] for row in members[self.member.pk]], [row['carried'] for row in members[self.admin.pk]]
+
+    def test_settlement_of_an_earlier_month(self):
+        months = [add_months(self.this_month, -1), self.this_month]
+        self.assertEqual(self.carried(months), ([-50, -50], [50, 50]))
+
+        # Recording it drops the cached opening balances once committed
+        with self.captureOnCommitCallbacks(execute=True):
+            Settlement.objects.create(
+                group=self.group, payer=self.member, payee=self.admin, amount=50,
+                year=self.earlier.year, month=self.earlier.month,
+            )
+        self.assertEqual(self.carried(months), ([0, 0], [0, 0]))
+
+    def test_settlement_within_the_range(self):
+        Settlement.objects.create(
+            group=self.group, payer=self.member, payee=self.admin, amount=30,
+            year=self.earlier.year, month=self.earlier.month,
+        )
+        months = report_months('custom', f'{self.earlier:%Y-%m}', f'{self.this_month:%Y-%m}')
+        self.assertEqual(self.carried(months), ([-20, -20, -20], [20, 20, 20]))
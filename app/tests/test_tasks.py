@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, timedelta
+
+from app.mail import QueuedEmailBackend
+from app.models import Group, MealEntry, MonthSnapshot, Task
+from app.tasks import run_due
+
+
+@override_settings(
+    TASKS_EAGER=False, 
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class TaskQueueTests(TestCase):
+    
+    def test_sent_mail_body_not_kept(self):
+        message = mail.EmailMessage('Password reset', 'https://example.com/reset/token/', to=['a@example.com'])
+        QueuedEmailBackend().send_messages([message])
+        run_due(10)
+        
+        self.assertEqual(len(mail.outbox), 1)
+        sent = Task.objects.get()
+        self.assertEqual(sent.status, Task.DONE)
+        self.assertEqual(sent.kwargs, {})
+    
+    @override_settings(TASKS_KEEP_DAYS=7)
+    def test_finished_tasks_pruned(self):
+        now = timezone.now()
+        old = now - timedelta(days=8)
+        for status in [Task.DONE, Task.FAILED, Task.QUEUED]:
+            Task.objects.create(name='app.tasks.rebuild_ledger', status=status, max_attempts=1, run_at=now + timedelta(days=1))
+        # updated_at is set on every save, back date it with an update
+        Task.objects.update(updated_at=old)
+        
+        run_due(10)
+        self.assertEqual(list(Task.objects.values_list('status', flat=True)), [Task.QUEUED])
+
+
+@override_settings(TASKS_EAGER=False)
+class CloseMonthTests(TestCase):
+    
+    def test_close_queued(self):
+        admin = User.objects.create_user('admin', password='pw')
+        group = Group.objects.create(name='Flat', admin=admin)
+        last_month = date.today().replace(day=1) - timedelta(days=1)
+        MealEntry.objects.create(user=admin, group=group, date=last_month, breakfast=1, lunch=1, dinner=1)
+        
+        self.client.force_login(admin)
+        self.client.post(reverse('close-month'), {'month': last_month.isoformat(), 'locked': 'on'})
+        self.assertFalse(MonthSnapshot.objects.exists())
+        
+        run_due(10)
+        snapshot = MonthSnapshot.objects.get(group=group)
+        self.assertEqual((snapshot.total_meals, snapshot.locked, snapshot.closed_by_id), (3, True, admin.pk))
@@ -1,4 +1,5 @@
 from django.urls import path
+from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
 from app import views
 
@@ -13,12 +14,31 @@ urlpatterns = [
     path('create-new-group/', views.create_group, name='create-group'),
     path('join-existing-group/', views.join_group, name='join-group'),
     path('leave-group/', views.leave_group, name='leave-group'),
+    path('import-data/', views.import_data, name='import-data'),
     
     # Main App (Protected) 
     path('', views.home, name='home'),
     path('track-meals/', views.track_meals, name='track-meals'),
     path('member-details/<int:member_pk>/', views.member_details, name='member-details'),
+    path('member-details/<int:member_pk>/meals/', views.member_history_page, {'kind': 'meals'}, name='member-meals'),
+    path('member-details/<int:member_pk>/groceries/', views.member_history_page, {'kind': 'groceries'}, name='member-groceries'),
     path('create-grocery/<int:member_pk>/', views.create_grocery, name='create-grocery'),
+    path('export-month/', views.export_month, name='export-month'),
+    path('export-month/<int:task_pk>/', views.export_download, name='export-download'),
+    path('record-settlement/', views.record_settlement, name='record-settlement'),
+    path('close-month/', views.close_month, name='close-month'),
+    path('reopen-month/', views.reopen_month, name='reopen-month'),
+    path('reports/', views.reports, name='reports'),
+    path('activity/', views.activity, name='activity'),
+    path('activity/page/', views.activity_history_page, name='activity-page'),
+    
+    # Async versions of the read-heavy pages, for the ASGI deployment
+    path('async/', views.home_async, name='async-home'),
+    path('async/track-meals/', views.track_meals_async, name='async-track-meals'),
+    path('async/member-details/<int:member_pk>/', views.member_details_async, name='async-member-details'),
+    
+    # Service worker of the offline track meals, served from the root for its scope
+    path('sw.js', TemplateView.as_view(template_name='sw.js', content_type='application/javascript'), name='service-worker'),
     
     # Update things
     path('update-meal/<int:member_pk>/', views.update_meal, name='update-meal'),
@@ -50,5 +70,16 @@ forgot_pass_urls = [
         name='password_reset_complete'
     ),
 ]
+api_urls = [
+    path('api/group-summary/', views.group_summary_api, name='api-group-summary'),
+    path('api/members/<int:member_pk>/summary/', views.member_summary_api, name='api-member-summary'),
+    path('api/meals/', views.meals_api, name='api-meals'),
+    path('api/meals/<int:meal_pk>/', views.meal_update_api, name='api-meal'),
+    path('api/meals/sync/', views.meals_sync_api, name='api-meals-sync'),
+    path('api/groceries/', views.groceries_api, name='api-groceries'),
+    path('api/groceries/<int:grocery_pk>/', views.grocery_update_api, name='api-grocery'),
+    path('api/reports/', views.report_api, name='api-report'),
+]
 urlpatterns.extend(acc_related_urls)
 urlpatterns.extend(forgot_pass_urls)
+urlpatterns.extend(api_urls)
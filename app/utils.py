@@ -1,4 +1,5 @@
 from django.shortcuts import redirect
+from asgiref.sync import iscoroutinefunction
 from datetime import date, timedelta
 
 
@@ -8,14 +9,65 @@ def group_required(view_func):
     Decorator to check if user has a group
     Redirects to setup page if no group
     """
+    if iscoroutinefunction(view_func):
+        async def async_wrapper(request, *args, **kwargs):
+            if not request.membership:
+                return redirect('setup-group')
+            
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+    
     def wrapper(request, *args, **kwargs):
-        if not hasattr(request.user, 'group_membership'):
+        # Set by MembershipMiddleware
+        if not request.membership:
             return redirect('setup-group')
         
         return view_func(request, *args, **kwargs)
     return wrapper
 
 
+def parse_meal_count(value) -> int:
+    """
+    Meal count from a form value, clamped within 0-3 as per model
+    Raises ValueError for anything but numbers
+    """
+    count = int(value) if value else 0
+    return max(0, min(3, count))
+
+
+def calc_cost_per_meal(total_expenses: int, total_meals: int) -> float:
+    """Cost of a single meal of a month, rounded to 2 decimal places"""
+    # avoid division by zero
+    if total_meals <= 0:
+        return 0
+    return round(total_expenses / total_meals, 2)
+
+
+def month_range(year: int, month: int):
+    """
+    First day of the month and first day of the next month, for filtering
+    with date__gte and date__lt, which can use the date indexes 
+    unlike date__year/date__month
+    Return: 
+        tuple(datetime.date, datetime.date)
+    """
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def is_past_month(year: int, month: int) -> bool:
+    """True for a month before the current one"""
+    today = date.today()
+    return (year, month) < (today.year, today.month)
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` after (or before, if negative) the month of day"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
 def get_date(date_str: str, direction: str, unit: str = 'day'): 
     """
     Args: 
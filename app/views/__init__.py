@@ -1,6 +1,7 @@
 from .group import (
     setup_group, create_group, 
     join_group, leave_group,
+    import_data,
 )
 from .auth import (
     login_user, logout_user, register_user,
@@ -10,5 +11,20 @@ from .auth import (
 from .main import (
     home, track_meals, 
     member_details, update_meal, 
-    create_grocery, update_grocery
+    create_grocery, update_grocery,
+    member_history_page, record_settlement,
+    close_month, reopen_month,
+    activity, activity_history_page,
+)
+from .async_main import (
+    home_async, track_meals_async, 
+    member_details_async,
+)
+from .export import export_month, export_download
+from .reports import reports
+from .api import (
+    group_summary_api, member_summary_api,
+    meals_api, meal_update_api, meals_sync_api,
+    groceries_api, grocery_update_api,
+    report_api,
 )
@@ -0,0 +1,550 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET, require_POST
+from datetime import date, datetime, timedelta
+import hashlib
+import json
+
+from app.audit import record
+from app.models import AuditLog, GroupMember, MealEntry, GroceryExpense, MonthLocked, MonthlyLedger, MonthSnapshot, Settlement
+from app.reports import group_report, report_months
+from app.utils import get_date, parse_meal_count
+from .helpers import group_summary, get_member_details
+
+
+def api_response(data, status=200, etag=None):
+    """Compact JSON response, with an ETag when given"""
+    body = json.dumps(data, separators=(',', ':'), cls=DjangoJSONEncoder)
+    response = HttpResponse(body, status=status, content_type='application/json')
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def api_error(message, status=400):
+    return api_response({'error': message}, status=status)
+
+
+def not_modified(request, etag):
+    """True if the client already has the response of this ETag"""
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in etags or '*' in etags
+
+
+def rows_version(queryset) -> str:
+    """Last change and count of the rows, every write of them changes one or the other"""
+    rows = queryset.order_by().aggregate(Max('updated_at'), Count('id'))
+    updated = rows['updated_at__max']
+    return '{:x}.{}'.format(int(updated.timestamp() * 1_000_000) if updated else 0, rows['id__count'])
+
+
+def month_version(group_id, year, month) -> str:
+    """
+    Version of the figures of a group-month, from the database so it's the
+    same in every process: its ledger rows (any meal or grocery write of the
+    month refreshes them) and its snapshot, if closed
+    """
+    snapshot = MonthSnapshot.objects.filter(group_id=group_id, year=year, month=month).values_list('pk', 'locked').first()
+    return '{}.{}'.format(
+        rows_version(MonthlyLedger.objects.filter(group_id=group_id, year=year, month=month)),
+        '{}{}'.format(*snapshot) if snapshot else 'open',
+    )
+
+
+def report_version(group_id) -> str:
+    """Version of every month of a group, for the reports: all its ledger rows and settlements"""
+    settlements = Settlement.objects.filter(group_id=group_id).order_by().aggregate(Max('id'), Count('id'))
+    return '{}.{}.{}'.format(
+        rows_version(MonthlyLedger.objects.filter(group_id=group_id)),
+        settlements['id__max'], settlements['id__count'],
+    )
+
+
+def api_view(view_func):
+    """
+    Decorator for the API views, like login_required + group_required
+    but answering with JSON errors instead of redirects. A change of
+    a locked month is answered with 409
+    """
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return api_error('Login required', status=401)
+        if not request.membership:
+            return api_error('Join a group first', status=403)
+        
+        try:
+            return view_func(request, *args, **kwargs)
+        except MonthLocked as e:
+            return api_error(str(e), status=409)
+    return wrapper
+
+
+def read_json(request) -> dict:
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValueError('Invalid JSON')
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    return data
+
+
+def group_member(group, member_pk):
+    """GroupMember of the group by pk, None if not found or not a number"""
+    try:
+        member_pk = int(member_pk)
+    except (TypeError, ValueError):
+        return None
+    return GroupMember.objects.filter(pk=member_pk, group=group).select_related('user', 'group').first()
+
+
+def can_edit(user, member_user_id, group):
+    """Owner of the entries or the group admin"""
+    return user.pk in (member_user_id, group.admin_id)
+
+
+def serialize_meal(meal):
+    return {
+        'id': meal.pk,
+        'date': meal.date,
+        'breakfast': meal.breakfast,
+        'lunch': meal.lunch,
+        'dinner': meal.dinner,
+        'total': meal.breakfast + meal.lunch + meal.dinner,
+        'updated_at': meal.updated_at,
+    }
+
+
+def serialize_grocery(grocery):
+    return {
+        'id': grocery.pk,
+        'date': grocery.date,
+        'item_name': grocery.item_name,
+        'quantity': grocery.quantity,
+        'cost': grocery.cost,
+    }
+
+
+def serialize_member(member):
+    """Monthly figures added to member: GroupMember by the summary"""
+    return {
+        'id': member.pk,
+        'name': member.user.first_name,
+        'total_meals': member.total_meals,
+        'total_spent': member.total_spent,
+        'total_cost': member.total_cost,
+        'balance': member.balance,
+        'breakfast': member.months_total_breakfast,
+        'lunch': member.months_total_lunch,
+        'dinner': member.months_total_dinner,
+    }
+
+
+def member_summary_data(member, month: int, year: int):
+    member = get_member_details(member, month, year, history=False)
+    return serialize_member(member)
+
+
+@require_GET
+@api_view
+def group_summary_api(request):
+    group = request.user.group_membership.group
+    current_date = get_date(request.GET.get('date'), None, unit='month')
+    
+    # The month version changes with every meal/grocery write of the month,
+    # the member count and last id with every join/leave
+    members = group.members.aggregate(Count('id'), Max('id'))
+    etag = '"s{}-{:%Y%m}-{}-{}-{}"'.format(
+        group.pk, current_date,
+        month_version(group.pk, current_date.year, current_date.month),
+        members['id__count'], members['id__max'],
+    )
+    if not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    
+    group = group_summary(group, current_date.month, current_date.year)
+    members_list = group.members.all().select_related('user')
+    
+    return api_response({
+        'month': f'{current_date:%Y-%m}',
+        'total_expenses': group.total_expenses,
+        'total_meals': group.total_meals,
+        'cost_per_meal': group.cost_per_meal,
+        'closed': group.summary.snapshot is not None,
+        'locked': bool(group.summary.snapshot and group.summary.snapshot.locked),
+        'members': [
+            serialize_member(group.summary.apply_to_member(member)) 
+            for member in members_list
+        ],
+    }, etag=etag)
+
+
+@require_GET
+@api_view
+def member_summary_api(request, member_pk):
+    group = request.user.group_membership.group
+    member = group_member(group, member_pk)
+    
+    if not member:
+        return api_error('Not a valid user/member!', status=404)
+    
+    current_date = get_date(request.GET.get('date'), None, unit='month')
+    
+    etag = '"m{}-{:%Y%m}-{}"'.format(
+        member.pk, current_date,
+        month_version(group.pk, current_date.year, current_date.month),
+    )
+    if not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    
+    data = member_summary_data(member, current_date.month, current_date.year)
+    data['month'] = f'{current_date:%Y-%m}'
+    return api_response(data, etag=etag)
+
+
+@api_view
+def meals_api(request):
+    """
+    GET: meals of every member of the group for ?date=yyyy-mm-dd
+    POST: create or update the meal of a member for a date
+    """
+    group = request.user.group_membership.group
+    
+    if request.method == 'GET':
+        meal_date = get_date(request.GET.get('date'), None)
+        meals_by_user = {
+            meal.user_id: meal 
+            for meal in MealEntry.objects.filter(group=group, date=meal_date)
+        }
+        
+        members = []
+        for member in group.members.all().select_related('user'):
+            meal = meals_by_user.get(member.user_id)
+            members.append({
+                'member': member.pk,
+                'name': member.user.first_name,
+                'meal': serialize_meal(meal) if meal else None,
+            })
+        
+        data = {'date': meal_date, 'members': members}
+        etag = '"d{}"'.format(hashlib.md5(json.dumps(data, cls=DjangoJSONEncoder).encode()).hexdigest()[:16])
+        if not_modified(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        return api_response(data, etag=etag)
+    
+    if request.method != 'POST':
+        return api_error('Invalid request method', status=405)
+    
+    try:
+        data = read_json(request)
+        meal_date = date.fromisoformat(str(data.get('date', '')))
+        counts = {meal: parse_meal_count(data.get(meal)) for meal in ['breakfast', 'lunch', 'dinner']}
+    except (TypeError, ValueError) as e:
+        return api_error(f'Invalid input: {e}')
+    
+    member = group_member(group, data.get('member'))
+    if not member:
+        return api_error('Not a valid user/member!', status=404)
+    if not can_edit(request.user, member.user_id, group):
+        return api_error('Permission denied', status=403)
+    
+    meal, created = MealEntry.objects.update_or_create(
+        user_id=member.user_id, group=group, date=meal_date, defaults=counts
+    )
+    
+    return api_response({
+        'meal': serialize_meal(meal),
+        'member': member_summary_data(member, meal_date.month, meal_date.year),
+    }, status=201 if created else 200)
+
+
+@require_POST
+@api_view
+def meal_update_api(request, meal_pk):
+    group = request.user.group_membership.group
+    meal = MealEntry.objects.filter(pk=meal_pk, group=group).first()
+    
+    if not meal:
+        return api_error('Meal not found', status=404)
+    if not can_edit(request.user, meal.user_id, group):
+        return api_error('Permission denied', status=403)
+    
+    try:
+        data = read_json(request)
+        for field in ['breakfast', 'lunch', 'dinner']:
+            if field in data:
+                setattr(meal, field, parse_meal_count(data[field]))
+    except (TypeError, ValueError) as e:
+        return api_error(f'Invalid input: {e}')
+    
+    meal.save()
+    member = GroupMember.objects.select_related('user', 'group').get(user_id=meal.user_id)
+    
+    return api_response({
+        'meal': serialize_meal(meal),
+        'member': member_summary_data(member, meal.date.month, meal.date.year),
+    })
+
+
+SYNC_BATCH_LIMIT = 500
+MEAL_FIELDS = ['breakfast', 'lunch', 'dinner']
+
+
+def parse_sync_entry(entry, members: dict):
+    """
+    Validate an entry of the meals sync batch
+    Args:
+        members: user id of every member of the group, by member pk
+    Return:
+        tuple(user_id, date, counts: dict, base: datetime or None)
+    """
+    if not isinstance(entry, dict):
+        raise ValueError('Expected a JSON object')
+    
+    try:
+        user_id = members[int(entry.get('member'))]
+    except (TypeError, ValueError, KeyError):
+        raise ValueError('Not a valid user/member!')
+    
+    meal_date = date.fromisoformat(str(entry.get('date', '')))
+    counts = {meal: parse_meal_count(entry.get(meal)) for meal in MEAL_FIELDS}
+    
+    # updated_at of the row as the client last saw it, none for a new row
+    base = entry.get('base') or None
+    if base:
+        base = datetime.fromisoformat(str(base))
+        if timezone.is_naive(base):
+            base = timezone.make_aware(base)
+    
+    return user_id, meal_date, counts, base
+
+
+def same_version(meal, base) -> bool:
+    # The JSON encoder keeps milliseconds only
+    return base is not None and abs(meal.updated_at - base) < timedelta(milliseconds=1)
+
+
+@require_POST
+@api_view
+def meals_sync_api(request):
+    """
+    Apply a batch of meal edits made offline, 
+    {"entries": [{"id", "member", "date", "breakfast", "lunch", "dinner", "base"}]}
+    
+    Every entry gets a result with the id it was sent with: 
+        created/updated: saved
+        unchanged: the row already has these counts, nothing written (safe to resend)
+        conflict: the row changed since base, the client's updated_at of it
+        superseded: a later entry of the batch is for the same member and date
+        locked: the month is closed and locked by the group admin, nothing written
+        error: invalid entry
+    along with the meal as it is now on the server
+    """
+    group = request.user.group_membership.group
+    
+    try:
+        entries = read_json(request).get('entries')
+        if not isinstance(entries, list):
+            raise ValueError('entries must be a list')
+        if len(entries) > SYNC_BATCH_LIMIT:
+            raise ValueError(f'At most {SYNC_BATCH_LIMIT} entries per request')
+    except ValueError as e:
+        return api_error(f'Invalid input: {e}')
+    
+    members = dict(GroupMember.objects.filter(group=group).values_list('pk', 'user_id'))
+    
+    results = []
+    pending = {}   # (user_id, date) -> (result, counts, base)
+    for entry in entries:
+        result = {'id': entry.get('id') if isinstance(entry, dict) else None}
+        results.append(result)
+        
+        try:
+            user_id, meal_date, counts, base = parse_sync_entry(entry, members)
+        except (TypeError, ValueError) as e:
+            result.update(status='error', error=str(e))
+            continue
+        
+        key = (user_id, meal_date)
+        if key in pending:
+            pending[key][0]['status'] = 'superseded'
+        pending[key] = (result, counts, base)
+    
+    if not pending:
+        return api_response({'results': results})
+    
+    with transaction.atomic():
+        existing = {
+            (meal.user_id, meal.date): meal
+            for meal in MealEntry.objects.select_for_update().filter(
+                group=group,
+                user_id__in={user_id for user_id, _ in pending},
+                date__in={meal_date for _, meal_date in pending},
+            )
+        }
+        
+        writes = []
+        for key, (result, counts, base) in pending.items():
+            meal = existing.get(key)
+            
+            if meal and all(getattr(meal, field) == counts[field] for field in MEAL_FIELDS):
+                result.update(status='unchanged', meal=serialize_meal(meal))
+            elif meal and not same_version(meal, base):
+                result.update(status='conflict', meal=serialize_meal(meal))
+            else:
+                result['status'] = 'updated' if meal else 'created'
+                writes.append(MealEntry(user_id=key[0], group=group, date=key[1], **counts))
+        
+        # bulk_create skips the model's check of a closed month
+        locked = MonthSnapshot.open_months(group.pk, [meal.date for meal in writes])
+        if locked:
+            for meal in writes:
+                key = (meal.user_id, meal.date)
+                if (meal.date.year, meal.date.month) in locked:
+                    pending[key][0]['status'] = 'locked'
+                    if key in existing:
+                        pending[key][0]['meal'] = serialize_meal(existing[key])
+            writes = [meal for meal in writes if (meal.date.year, meal.date.month) not in locked]
+        
+        if writes:
+            # Insert or update the rows in a single statement, like the track meals form
+            MealEntry.objects.bulk_create(
+                writes,
+                update_conflicts=True,
+                unique_fields=['user', 'group', 'date'],
+                update_fields=MEAL_FIELDS + ['updated_at'],
+            )
+            
+            saved = MealEntry.objects.filter(
+                group=group,
+                user_id__in={meal.user_id for meal in writes},
+                date__in={meal.date for meal in writes},
+            )
+            for meal in saved:
+                key = (meal.user_id, meal.date)
+                if key in pending and pending[key][0]['status'] in ('created', 'updated'):
+                    pending[key][0]['meal'] = serialize_meal(meal)
+            
+            # bulk_create doesn't send signals, log the changes and refresh the ledger of every month touched
+            record(*AuditLog.upserts(writes, {
+                key: [getattr(meal, field) for field in MealEntry.AUDITED] for key, meal in existing.items()
+            }))
+            for day in {meal.date.replace(day=1) for meal in writes}:
+                MonthlyLedger.refresh_month(group.pk, day)
+    
+    return api_response({'results': results})
+
+
+def parse_grocery(data: dict, grocery=None):
+    """Validate grocery fields of data onto grocery (a new one if not given)"""
+    grocery = grocery or GroceryExpense()
+    
+    if grocery.pk is None or 'item_name' in data:
+        item_name = str(data.get('item_name') or '').strip()
+        if not item_name:
+            raise ValueError('Item Name is required')
+        grocery.item_name = item_name[:200]
+    
+    if 'quantity' in data:
+        grocery.quantity = str(data['quantity'] or '').strip()[:50]
+    
+    if grocery.pk is None or 'cost' in data:
+        cost = int(data.get('cost') or 0)
+        if cost < 0:
+            raise ValueError('Cost cannot be negative')
+        grocery.cost = cost
+    
+    return grocery
+
+
+@require_POST
+@api_view
+def groceries_api(request):
+    """Create a grocery expense of a member"""
+    group = request.user.group_membership.group
+    
+    try:
+        data = read_json(request)
+        grocery = parse_grocery(data)
+        grocery.date = date.fromisoformat(str(data.get('date', '')))
+    except (TypeError, ValueError) as e:
+        return api_error(f'Invalid input: {e}')
+    
+    member = group_member(group, data.get('member'))
+    if not member:
+        return api_error('Not a valid user/member!', status=404)
+    if not can_edit(request.user, member.user_id, group):
+        return api_error('Permission denied', status=403)
+    
+    grocery.user_id = member.user_id
+    grocery.group = group
+    grocery.save()
+    
+    return api_response({
+        'grocery': serialize_grocery(grocery),
+        'member': member_summary_data(member, grocery.date.month, grocery.date.year),
+    }, status=201)
+
+
+@require_POST
+@api_view
+def grocery_update_api(request, grocery_pk):
+    group = request.user.group_membership.group
+    grocery = GroceryExpense.objects.filter(pk=grocery_pk, group=group).first()
+    
+    if not grocery:
+        return api_error('Grocery not found', status=404)
+    if not can_edit(request.user, grocery.user_id, group):
+        return api_error('Permission denied', status=403)
+    
+    try:
+        parse_grocery(read_json(request), grocery)
+    except (TypeError, ValueError) as e:
+        return api_error(f'Invalid input: {e}')
+    
+    grocery.save()
+    member = GroupMember.objects.select_related('user', 'group').get(user_id=grocery.user_id)
+    
+    return api_response({
+        'grocery': serialize_grocery(grocery),
+        'member': member_summary_data(member, grocery.date.month, grocery.date.year),
+    })
+
+
+@require_GET
+@api_view
+def report_api(request):
+    """
+    Monthly series of the group and every member, ?range=12m|ytd|custom 
+    with ?start=yyyy-mm&end=yyyy-mm for custom
+    """
+    group = request.user.group_membership.group
+    
+    try:
+        months = report_months(request.GET.get('range', '12m'), request.GET.get('start'), request.GET.get('end'))
+    except ValueError as e:
+        return api_error(f'Invalid range: {e}')
+    
+    # Any change to the months or the settlements of the group changes the history version
+    members = group.members.aggregate(Count('id'), Max('id'))
+    etag = '"r{}-{:%Y%m}-{:%Y%m}-{}-{}-{}"'.format(
+        group.pk, months[0], months[-1], report_version(group.pk),
+        members['id__count'], members['id__max'],
+    )
+    if not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    
+    report = group_report(group, months)
+    
+    return api_response({
+        'months': [f'{month:%Y-%m}' for month in months],
+        'group': report['group'],
+        'members': [
+            {'user': user_id, 'series': series} 
+            for user_id, series in report['members'].items()
+        ],
+    }, etag=etag)
@@ -0,0 +1,115 @@
+"""
+Async versions of the read-heavy pages, for the ASGI deployment.
+Independent queries are awaited together with asyncio.gather, templates
+render in a worker thread as the context processors touch the session
+"""
+from django.shortcuts import render, redirect
+from django.urls import reverse
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
+import asyncio
+
+from app.models import Group, GroupMember, MealEntry
+from app.utils import get_date, group_required, is_past_month
+from app.settlement import month_settlements
+from .helpers import handle_add_update_meals, amonth_summary, aget_member_details, group_settlement
+
+
+arender = sync_to_async(render)
+
+
+async def alist(queryset) -> list:
+    return [obj async for obj in queryset]
+
+
+async def user_group(request):
+    """Group of the logged in user along with its admin"""
+    return await Group.objects.select_related('admin').aget(
+        pk=request.membership.group_id
+    )
+
+
+@login_required
+@group_required
+async def home_async(request):
+    current_date = get_date(request.GET.get('date'), request.GET.get('dir'), unit='month')
+    group = await user_group(request)
+    
+    summary, members_list, settlements = await asyncio.gather(
+        amonth_summary(group, current_date.month, current_date.year),
+        alist(group.members.all().select_related('user')),
+        alist(month_settlements(group, current_date.year, current_date.month).select_related('payer', 'payee')),
+    )
+    
+    summary.apply_to_group(group)
+    group.summary = summary
+    
+    for member in members_list:
+        summary.apply_to_member(member)
+    group.members_list = members_list
+    
+    group_settlement(group, members_list, settlements)
+    
+    context = {
+        'group': group,
+        'current_month': current_date,
+        'past_month': is_past_month(current_date.year, current_date.month),
+    }
+    return await arender(request, 'home/dashboard.html', context)
+
+
+@login_required
+@group_required
+async def track_meals_async(request):
+    meal_date = get_date(request.GET.get('date'), request.GET.get('dir'))
+    group = request.group
+    
+    if request.method == 'POST':
+        saved_meals = await sync_to_async(handle_add_update_meals)(request, group)
+        if saved_meals:
+            return redirect(f"{reverse('async-track-meals')}?date={saved_meals[0].date:%Y-%m-%d}")
+    
+    meals, members_list = await asyncio.gather(
+        alist(MealEntry.objects.filter(group=group, date=meal_date)),
+        alist(group.members.all().select_related('user')),
+    )
+    
+    meals_by_user = {meal.user_id: meal for meal in meals}
+    
+    for member in members_list:
+        meal = meals_by_user.get(member.user_id)
+        
+        member.breakfast = meal.breakfast if meal else 0
+        member.lunch = meal.lunch if meal else 0
+        member.dinner = meal.dinner if meal else 0
+        
+        # Version of the row for the offline sync, none if not saved yet
+        member.updated_at = meal.updated_at if meal else None
+    
+    group.members_list = members_list
+    
+    context = {
+        'group': group,
+        'meal_date': meal_date,
+    }
+    return await arender(request, 'home/track_meals.html', context)
+
+
+@login_required
+@group_required
+async def member_details_async(request, member_pk):
+    member = await GroupMember.objects.filter(pk=member_pk).select_related('user', 'group').afirst()
+    
+    if not member:
+        await sync_to_async(messages.error)(request, 'Not a valid user/member!')
+        return redirect('async-home')
+    
+    info_date = get_date(request.GET.get('date'), request.GET.get('dir'), unit='month')
+    member = await aget_member_details(member, info_date.month, info_date.year)
+    
+    context = {
+        'member': member,
+        'info_date': info_date
+    }
+    return await arender(request, 'home/member_details.html', context)
@@ -3,6 +3,10 @@ from django.contrib.auth import login, authenticate, logout, update_session_auth
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError
+from django.db.models import Q
+
+from app.hashers import rehash_later
 
 
 def register_user(request):
@@ -35,10 +39,16 @@ def register_user(request):
         if password1 != password2:
             errors.append('Passwords do not match.')
         
-        if User.objects.filter(username=phone).exists():
+        # Both uniqueness checks in one query
+        lookup = Q(username=phone)
+        if email:
+            lookup |= Q(email=email)
+        taken = list(User.objects.filter(lookup).values_list('username', 'email'))
+        
+        if any(username == phone for username, _ in taken):
             errors.append('User with the phone number already exists.')
         
-        if email and User.objects.filter(email=email).exists():
+        if email and any(user_email == email for _, user_email in taken):
             errors.append('User with the email already exists.')
         
         if errors:
@@ -47,16 +57,21 @@ def register_user(request):
             return render(request, 'auth/register.html', context)
         
         try:
-            user = User.objects.create_user(
+            # Hashed once and inserted in one write
+            User.objects.create_user(
                 username=phone,
                 email=email,
-                first_name=fullname
+                first_name=fullname,
+                password=password1
             )
-            user.set_password(password1)
-            user.save()
             
             messages.success(request, 'Registration successful! You can now login now.')
             return redirect('login')
+        
+        except IntegrityError:
+            # Registered by a concurrent request since the check above
+            messages.error(request, 'User with the phone number already exists.')
+            return render(request, 'auth/register.html', context)
             
         except Exception as e:
             messages.error(request, f'Registration failed: {str(e)}')
@@ -73,9 +88,10 @@ def login_user(request):
         phone = request.POST.get('phone')
         password = request.POST.get('password')
         
-        user = authenticate(username=phone, password=password)
+        user = authenticate(request, username=phone, password=password)
         if user:
             login(request, user)
+            rehash_later(request, user, password)
             
             # Check if user has group
             if hasattr(user, 'group_membership'):
@@ -171,7 +187,7 @@ def delete_account(request):
     user = request.user
     
     # If not a member of a group, delete right away
-    if not hasattr(user, 'group_membership'):
+    if not request.membership:
         user.delete()
         messages.success(request, "Account Delete - Done")
     
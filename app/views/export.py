@@ -0,0 +1,84 @@
+from django.shortcuts import render, redirect
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from app.exports import export_sections, export_file, stream_csv, xlsx_available
+from app.models import Task
+from app.utils import get_date, group_required, month_range
+
+
+@login_required
+@group_required
+def export_month(request):
+    """
+    Download meals, groceries and settlement of the group as CSV, streamed,
+    or XLSX, built by a background task (see export_download)
+    """
+    group = request.user.group_membership.group
+    
+    # Whole history or a single month
+    if request.GET.get('all'):
+        start, end = None, None
+        filename = f'{slugify(group.name)}-all'
+    else:
+        export_date = get_date(request.GET.get('date'), None, unit='month')
+        start, end = month_range(export_date.year, export_date.month)
+        filename = f'{slugify(group.name)}-{export_date:%Y-%m}'
+    
+    if request.GET.get('format') == 'xlsx':
+        if not xlsx_available():
+            messages.error(request, "XLSX export is not available, use CSV")
+            return redirect('home')
+        
+        export = export_file.enqueue(
+            group_id=group.pk, 
+            filename=filename,
+            start=start and start.isoformat(),
+            end=end and end.isoformat(),
+        )
+        return redirect('export-download', task_pk=export.pk)
+    
+    sections = export_sections(group, start, end)
+    
+    response = StreamingHttpResponse(stream_csv(sections), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+@login_required
+@group_required
+def export_download(request, task_pk):
+    """The file of a queued export once written, a page waiting for it until then"""
+    export = Task.objects.filter(
+        pk=task_pk, 
+        name=export_file.task_name, 
+        kwargs__group_id=request.user.group_membership.group_id
+    ).first()
+    
+    if not export:
+        messages.error(request, "Export not found")
+        return redirect('home')
+    
+    if export.status == Task.FAILED:
+        messages.error(request, "The export failed, try again later")
+        return redirect('home')
+    
+    if export.status == Task.DONE:
+        try:
+            file = open(export.result['path'], 'rb')
+        except FileNotFoundError:
+            messages.error(request, "The export has expired, export again")
+            return redirect('home')
+        return FileResponse(file, as_attachment=True, filename=export.result['filename'])
+    
+    # Queued past its run time with no attempt, no run_tasks worker is taking tasks
+    waiting = timezone.now() - export.run_at
+    no_worker = (
+        export.status == Task.QUEUED and not export.attempts 
+        and waiting.total_seconds() > settings.TASKS_PICKUP_TIMEOUT
+    )
+    return render(request, 'home/export_status.html', {'export': export, 'no_worker': no_worker})
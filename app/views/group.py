@@ -2,17 +2,23 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
-from app.models import Group, GroupMember
+from app.imports import CsvImport
+from app.join_codes import resolve_join_code
+from app.models import Group, GroupMember, MonthLocked
+from app.ratelimit import rate_limit
 from app.utils import group_required
-from .helpers import get_member_details
+from app.settlement import member_outstanding
 from datetime import date
+import csv
+import io
+import math
 
 
 @login_required
 def setup_group(request):
     """Main setup page - choose create or join"""
     # If user already has group, redirect to home
-    if hasattr(request.user, 'group_membership'):
+    if request.membership:
         return redirect('home')
     
     return render(request, 'group/setup_group.html')
@@ -24,7 +30,7 @@ def create_group(request):
     user = request.user
     
     # If user already has group, redirect to home
-    if hasattr(user, 'group_membership'):
+    if request.membership:
         return redirect('home')
     
     if request.method == 'POST':
@@ -53,27 +59,33 @@ def join_group(request):
     """Join existing group with code"""
     user = request.user
     
-    if hasattr(user, 'group_membership'):
+    if request.membership:
         return redirect('home')
     
     if request.method == 'POST':
-        try:
-            join_code = request.POST.get('join_code', '').strip().upper()
+        # Bounds guessing codes, from one address or one account
+        wait = rate_limit(request, 'join-group')
+        if wait:
+            messages.error(request, f'Too many attempts, try again in {math.ceil(wait)} seconds')
+            return redirect('setup-group')
         
-            group = Group.objects.get(join_code=join_code)
+        join_code = request.POST.get('join_code', '').strip().upper()
+        group = resolve_join_code(join_code)
+        
+        if group:
+            group_id, group_name = group
             
             # Add user as member
             GroupMember.objects.create(
                 user=user,
-                group=group,
+                group_id=group_id,
                 role='member'
             )
             
-            messages.success(request, f'Joined to "{group.name}" successfully!')
+            messages.success(request, f'Joined to "{group_name}" successfully!')
             return redirect('home')
-            
-        except Group.DoesNotExist:
-            messages.error(request, 'Invalid join code')
+        
+        messages.error(request, 'Invalid join code')
     
     return redirect('setup-group')
 
@@ -89,9 +101,9 @@ def leave_group(request):
     member = user.group_membership
     group = member.group
     
+    # Owes the group after the payments recorded this month
     current_date = date.today()
-    member = get_member_details(member, current_date.month, current_date.year)
-    has_balance = member.balance < 0
+    has_balance = member_outstanding(member, current_date.year, current_date.month) < 0
     
     
     if group.members.count() == 1:
@@ -112,7 +124,68 @@ def leave_group(request):
             messages.info(request, f"You have unsettled balance. Settle the balance first!")
         
         else:
-            messages.success(request, "Leaving the group!")
-            member.delete()
+            try:
+                member.delete()
+                messages.success(request, "Leaving the group!")
+            except MonthLocked as e:
+                messages.error(request, f"{e}, ask the admin to reopen it before leaving")
 
     return redirect('home')
+
+
+@login_required
+@group_required
+def import_data(request):
+    """Import meals and groceries history from CSV files, group admin only"""
+    group = request.user.group_membership.group
+    
+    if group.admin_id != request.user.pk:
+        messages.error(request, "Only the group admin can import data")
+        return redirect('home')
+    
+    if request.method != 'POST':
+        return render(request, 'group/import_data.html', {'group': group})
+    
+    uploads = {
+        'meals': request.FILES.get('meals_file'),
+        'groceries': request.FILES.get('groceries_file'),
+    }
+    if not any(uploads.values()):
+        messages.error(request, "Choose a meals or groceries CSV file")
+        return redirect('import-data')
+    
+    dry_run = bool(request.POST.get('dry_run'))
+    importer = CsvImport(group, dry_run=dry_run)
+    
+    try:
+        for kind, run in [('meals', importer.import_meals), ('groceries', importer.import_groceries)]:
+            if uploads[kind]:
+                run(io.TextIOWrapper(uploads[kind], encoding='utf-8-sig', newline=''))
+    
+    except (UnicodeDecodeError, csv.Error) as e:
+        messages.error(request, f"Could not read the file: {e}")
+        if not dry_run and any(importer.imported.values()):
+            messages.info(
+                request, 
+                f"{importer.imported['meals']} meals and {importer.imported['groceries']} groceries "
+                f"before the error were imported"
+            )
+        return redirect('import-data')
+    
+    finally:
+        # The figures of a long history are rebuilt after the response,
+        # along with the batches written before a failure
+        importer.finish(background=True)
+    
+    # Don't flood the page, the first few errors are enough to fix the file
+    for kind, line, message in importer.errors[:10]:
+        messages.error(request, f"{kind.title()} line {line}: {message}")
+    
+    action = "Validated" if dry_run else "Imported"
+    messages.success(
+        request, 
+        f"{action} {importer.imported['meals']} meals and {importer.imported['groceries']} groceries, "
+        f"{len(importer.errors)} invalid rows skipped"
+        + ("" if dry_run else ", the monthly figures update in a moment")
+    )
+    return redirect('import-data')
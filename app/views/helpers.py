@@ -1,154 +1,333 @@
 from django.contrib import messages
-from django.shortcuts import redirect
 
-from django.db.models import Sum
-from app.models import GroceryExpense, GroupMember, MealEntry
+from django.db import transaction
+from django.db.models import Q
+from datetime import date
+from app.audit import record
+from app.models import AuditLog, GroceryExpense, GroupMember, MealEntry, MonthLocked, MonthlyLedger, MonthSnapshot
+from app.utils import calc_cost_per_meal, is_past_month, month_range, parse_meal_count
+from app.cache import get_cached_summary, aget_cached_summary
+from app.settlement import minimal_transfers, outstanding_balances
+import asyncio
 
 
 def handle_add_update_meals(request, group):
+    """
+    Save the meals of every member for the posted date
+    Return: list of the saved MealEntry, None if nothing was saved
+    """
     date_str = request.POST.get('meal_date')
     
     if not date_str:
         messages.error(request, 'Date is required')
-        return redirect('track-meals')
+        return None
     
     try:
-        # Get all members in the group
-        members = GroupMember.objects.filter(group=group)
-        
-        # track if creating or updating
-        is_new_entry = False
-        
-        # Process each member's meal data
-        for member in members:
-            breakfast = request.POST.get(f'member_{member.pk}_breakfast')
-            lunch = request.POST.get(f'member_{member.pk}_lunch')
-            dinner = request.POST.get(f'member_{member.pk}_dinner')
+        meal_date = date.fromisoformat(date_str)
+    except ValueError:
+        messages.error(request, 'Invalid date format')
+        return None
+    
+    # Get all members in the group
+    members = GroupMember.objects.filter(group=group)
+    
+    # Parse and validate the whole form before writing anything
+    entries = []
+    for member in members:
+        try:
+            entries.append(MealEntry(
+                user_id=member.user_id,
+                group=group,
+                date=meal_date,
+                breakfast=parse_meal_count(request.POST.get(f'member_{member.pk}_breakfast')),
+                lunch=parse_meal_count(request.POST.get(f'member_{member.pk}_lunch')),
+                dinner=parse_meal_count(request.POST.get(f'member_{member.pk}_dinner')),
+            ))
+        except ValueError:
+            messages.error(request, 'Invalid meal value. Please enter numbers only.')
+            return None
+    
+    try:
+        with transaction.atomic():
+            # bulk_create skips the model's check of a closed month
+            MonthSnapshot.ensure_open(group.pk, meal_date)
             
-            # Convert to integers with validation
-            try:
-                breakfast_int = int(breakfast) if breakfast else 0
-                lunch_int = int(lunch) if lunch else 0
-                dinner_int = int(dinner) if dinner else 0
-                
-                # Validate within range (0-3 as per model)
-                breakfast_int = max(0, min(3, breakfast_int))
-                lunch_int = max(0, min(3, lunch_int))
-                dinner_int = max(0, min(3, dinner_int))
-                
-            except ValueError:
-                messages.error(request, 'Invalid meal value. Please enter numbers only.')
-                return redirect('track-meals')
+            # Rows of the date already saved, to tell created and updated apart
+            existing = {
+                (user_id, meal_date): counts
+                for user_id, *counts in MealEntry.objects.filter(
+                    group=group, 
+                    date=meal_date, 
+                    user_id__in=[entry.user_id for entry in entries]
+                ).values_list('user_id', *MealEntry.AUDITED)
+            }
+            updated = len(existing)
             
-            # update_or_create with defaults parameter
-            _, is_new_entry = MealEntry.objects.update_or_create(
-                user=member.user,
-                group=group,
-                date=date_str,
-                defaults={
-                    'breakfast': breakfast_int,
-                    'lunch': lunch_int,
-                    'dinner': dinner_int,
-                }
+            # Insert or update every member's row in a single statement
+            MealEntry.objects.bulk_create(
+                entries,
+                update_conflicts=True,
+                unique_fields=['user', 'group', 'date'],
+                update_fields=['breakfast', 'lunch', 'dinner', 'updated_at'],
             )
+            
+            # No signals either, log the changes here
+            record(*AuditLog.upserts(entries, existing))
+            
+            # bulk_create doesn't send signals, refresh the ledger of the month
+            MonthlyLedger.refresh_month(group.pk, meal_date)
         
-        action = 'added' if is_new_entry else 'updated'
-        messages.success(request, f'Meal entries {action} for {date_str}')
-        return redirect('track-meals')
+        created = len(entries) - updated
+        messages.success(request, f'Meal entries saved for {date_str}: {created} added, {updated} updated')
+        return entries
         
+    except MonthLocked as e:
+        messages.error(request, str(e))
+        return None
     except Exception as e:
         messages.error(request, f'Error saving meals: {str(e)}')
-        return redirect('track-meals')
+        return None
 
 
-def group_summary(group, month: int, year: int):
-    """Calculate monthly summary of a group"""
+class MonthSummary:
+    """
+    Group totals of a month along with the MonthlyLedger row 
+    of every member, keyed by user id. Built by month_summary(..),
+    snapshot is the MonthSnapshot of a closed month
+    """
     
-    group_groceries = GroceryExpense.objects.filter(
-        group=group,
-        date__year=year,
-        date__month=month
-    )
-    group_meals = MealEntry.objects.filter(
-        group=group,
-        date__year=year,
-        date__month=month
-    )
+    def __init__(self, members: dict):
+        self.members = members
+        self.total_meals = sum(ledger.total_meals for ledger in members.values())
+        self.total_expenses = sum(ledger.spent for ledger in members.values())
+        self.cost_per_meal = calc_cost_per_meal(self.total_expenses, self.total_meals)
+        self.snapshot = None
     
-    total_group_expenses = group_groceries.aggregate(Sum('cost'))['cost__sum'] or 0
-    total_group_meals = sum(meal.total for meal in group_meals)
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Summary of a closed month, as it was when closed"""
+        summary = cls(snapshot.ledgers())
+        summary.total_meals = snapshot.total_meals
+        summary.total_expenses = snapshot.total_expenses
+        summary.cost_per_meal = snapshot.cost_per_meal
+        summary.snapshot = snapshot
+        return summary
     
-    # Calculate cost per meal (avoid division by zero)
-    cost_per_meal = (total_group_expenses / total_group_meals) if total_group_meals > 0 else 0
+    def member(self, user_id) -> MonthlyLedger:
+        # Members without meals or groceries in the month have no ledger row
+        return self.members.get(user_id) or MonthlyLedger()
     
-    # Adding attributes to access in dashboard templates
-    group.total_expenses = total_group_expenses
-    group.total_meals = total_group_meals
-    group.cost_per_meal = round(cost_per_meal, 2)
+    def apply_to_group(self, group):
+        """Add the group totals as attributes of group: Group"""
+        group.total_expenses = self.total_expenses
+        group.total_meals = self.total_meals
+        group.cost_per_meal = self.cost_per_meal
+        return group
     
-    return group
+    def apply_to_member(self, member):
+        """Add the monthly figures of member: GroupMember as attributes"""
+        ledger = self.member(member.user_id)
+        
+        member.total_meals = ledger.total_meals
+        member.total_spent = ledger.spent
+        member.total_cost = ledger.cost
+        member.balance = ledger.balance
+        
+        member.months_total_breakfast = ledger.breakfast
+        member.months_total_lunch = ledger.lunch
+        member.months_total_dinner = ledger.dinner
+        return member
 
 
-def member_summary(member, group, month, year):
-    """Calculate monthly summary of a group member"""
+def month_summary(group, month: int, year: int) -> MonthSummary:
+    """
+    Monthly totals of a group and all of its members, read from the 
+    cache or else from the MonthSnapshot of a closed month, in one 
+    indexed read, or from the MonthlyLedger in a single query
+    """
+    def compute():
+        # Only a month that is over can be closed
+        if is_past_month(year, month):
+            snapshot = MonthSnapshot.objects.filter(group=group, year=year, month=month).first()
+            if snapshot:
+                return MonthSummary.from_snapshot(snapshot)
+        
+        ledgers = MonthlyLedger.objects.filter(group=group, year=year, month=month)
+        return MonthSummary({ledger.user_id: ledger for ledger in ledgers})
     
-    meals_list = MealEntry.objects.filter(
-        user=member.user,
-        group=group,
-        date__year=year,
-        date__month=month
-    )
+    return get_cached_summary(group.pk, year, month, compute)
+
+
+async def amonth_summary(group, month: int, year: int) -> MonthSummary:
+    """Async month_summary(..)"""
+    async def compute():
+        if is_past_month(year, month):
+            snapshot = await MonthSnapshot.objects.filter(group=group, year=year, month=month).afirst()
+            if snapshot:
+                return MonthSummary.from_snapshot(snapshot)
+        
+        ledgers = MonthlyLedger.objects.filter(group=group, year=year, month=month)
+        return MonthSummary({ledger.user_id: ledger async for ledger in ledgers})
     
-    groceries_list = GroceryExpense.objects.filter(
-        user=member.user,
-        group=group,
-        date__year=year,
-        date__month=month
-    )
+    return await aget_cached_summary(group.pk, year, month, compute)
+
+
+def group_summary(group, month: int, year: int):
+    """Calculate monthly summary of a group"""
+    summary = month_summary(group, month, year)
     
-    # Calculate meal totals
-    total_meals = sum(meal.total for meal in meals_list)
+    # Adding attributes to access in dashboard templates
+    summary.apply_to_group(group)
+    group.summary = summary
     
-    # Calculate spending
-    total_spent = groceries_list.aggregate(Sum('cost'))['cost__sum'] or 0
+    return group
+
+
+def group_settlement(group, members_list, settlements):
+    """
+    Add the payments that settle the month to group: Group, from its summary 
+    (see group_summary) and the settlements already recorded for the month
+    """
+    users = {member.user_id: member.user for member in members_list}
+    balances = outstanding_balances(group.summary, users.keys(), settlements)
     
-    return total_meals, total_spent, meals_list, groceries_list
+    group.transfers = [
+        {'payer': users[transfer.payer_id], 'payee': users[transfer.payee_id], 'amount': transfer.amount}
+        for transfer in minimal_transfers(balances)
+    ]
+    group.payments = settlements
+    
+    return group
 
 
-def get_member_details(member, month: int, year: int):
-    # Get the total meals and spending of a member/user
-    total_meals, total_spent, meals_list, grocery_list = member_summary(
-        member=member,
-        group=member.group,
-        month=month, 
-        year=year
-    )
+HISTORY_PAGE_SIZE = 20
+
+
+def member_history(member, kind: str, month: int, year: int):
+    """Meals or groceries (kind) of a member in the given month"""
+    model = MealEntry if kind == 'meals' else GroceryExpense
+    month_start, month_end = month_range(year, month)
     
-    # calling group_summary(..) -> Group, just to get the cost per meal
-    group = group_summary(
-        group=member.group, 
-        month=month, 
-        year=year
+    return model.objects.filter(
+        user_id=member.user_id,
+        group_id=member.group_id,
+        date__gte=month_start,
+        date__lt=month_end
     )
-    # group.cost_per_meal attribute added in the group_summary(..) -> Group
-    total_cost = total_meals * group.cost_per_meal
+
+
+def history_page(queryset, cursor: str = None, size: int = HISTORY_PAGE_SIZE):
+    """
+    Keyset pagination on (date, id), newest first
+    Args:
+        cursor: 'yyyy-mm-dd_id' of the last row of the previous page
+    Return:
+        tuple(list of rows, cursor of the next page or None)
+    """
+    queryset = history_queryset(queryset, cursor, size)
+    if queryset is None:
+        return [], None
+    return split_page(list(queryset), size)
+
+
+async def ahistory_page(queryset, cursor: str = None, size: int = HISTORY_PAGE_SIZE):
+    """Async history_page(..)"""
+    queryset = history_queryset(queryset, cursor, size)
+    if queryset is None:
+        return [], None
+    return split_page([row async for row in queryset], size)
+
+
+def history_queryset(queryset, cursor: str, size: int):
+    """Rows of the page after cursor, None for an invalid cursor"""
+    queryset = queryset.order_by('-date', '-id')
     
+    if cursor:
+        try:
+            date_str, pk = cursor.split('_')
+            cursor_date, pk = date.fromisoformat(date_str), int(pk)
+        except ValueError:
+            return None
+        
+        queryset = queryset.filter(Q(date__lt=cursor_date) | Q(date=cursor_date, id__lt=pk))
+    
+    # One more row than needed tells if there is a next page
+    return queryset[:size + 1]
+
+
+def history_cursor(row) -> str:
+    return f'{row.date.isoformat()}_{row.pk}'
+
+
+def split_page(rows: list, size: int, cursor=history_cursor):
+    """
+    Split the page from the extra row fetched to tell if there is a next one
+    Args:
+        cursor: function giving the cursor of the next page from the last row
+    """
+    if len(rows) <= size:
+        return rows, None
+    
+    rows = rows[:size]
+    return rows, cursor(rows[-1])
+
+
+def get_member_details(member, month: int, year: int, history: bool = True):
+    # Totals of the whole group, gives the cost per meal and the member's figures
+    summary = month_summary(member.group, month, year)
     
     # Adding attributes directly to member: GroupMember 
     # for easy access in member details page
-    member.total_meals = total_meals
-    member.total_spent = total_spent
-    member.total_cost = round(total_cost)
-    member.balance = round(total_spent - total_cost)
+    summary.apply_to_member(member)
     
+    # First page of the meals and groceries of the given month,
+    # the rest loads as the user scrolls
+    if history:
+        member.meals_list, member.meals_cursor = history_page(
+            member_history(member, 'meals', month, year)
+        )
+        member.groceries_list, member.groceries_cursor = history_page(
+            member_history(member, 'groceries', month, year)
+        )
     
-    # Include all the meals and groceries of the given month to the member
-    member.meals_list = meals_list
-    member.groceries_list = grocery_list
-    
-    # Include meals summary
-    member.months_total_breakfast = sum(meal.breakfast for meal in meals_list)
-    member.months_total_lunch = sum(meal.lunch for meal in meals_list)
-    member.months_total_dinner = sum(meal.dinner for meal in meals_list)
+    return member
+
+
+async def aget_member_details(member, month: int, year: int):
+    """
+    Async get_member_details(..), the month summary and the first page 
+    of meals and groceries are fetched concurrently
+    """
+    summary, meals, groceries = await asyncio.gather(
+        amonth_summary(member.group, month, year),
+        ahistory_page(member_history(member, 'meals', month, year)),
+        ahistory_page(member_history(member, 'groceries', month, year)),
+    )
+    summary.apply_to_member(member)
     
+    member.meals_list, member.meals_cursor = meals
+    member.groceries_list, member.groceries_cursor = groceries
     return member
+
+
+ACTIVITY_PAGE_SIZE = 30
+
+
+def activity_page(group, cursor: str = None, size: int = ACTIVITY_PAGE_SIZE):
+    """
+    AuditLog of a group newest first, keyset pagination on id
+    Args:
+        cursor: id of the last row of the previous page
+    Return:
+        tuple(list of rows, cursor of the next page or None)
+    """
+    logs = AuditLog.objects.filter(group=group).select_related('actor', 'user').order_by('-id')
+    
+    if cursor:
+        try:
+            logs = logs.filter(id__lt=int(cursor))
+        except ValueError:
+            return [], None
+    
+    # One more row than needed tells if there is a next page
+    return split_page(list(logs[:size + 1]), size, cursor=lambda log: str(log.pk))
@@ -1,11 +1,19 @@
 from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.urls import reverse
+from django.template.loader import render_to_string
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from datetime import date
 
-from app.models import GroupMember, MealEntry, GroceryExpense
-from app.utils import get_date, group_required
-from .helpers import handle_add_update_meals, get_member_details, member_summary, group_summary
+from app.models import GroupMember, MealEntry, GroceryExpense, MonthLocked, MonthSnapshot, Settlement
+from app import tasks
+from app.settlement import month_settlements
+from app.utils import get_date, group_required, is_past_month
+from .helpers import (
+    handle_add_update_meals, get_member_details, group_summary,
+    group_settlement, member_history, history_page, activity_page,
+)
 
 
 @login_required
@@ -30,23 +38,13 @@ def home(request):
     members_list = group.members.all().select_related('user')
     
     # add needed attributes for the dashboard to each member of the group
-    # member: GroupMember
-    for mem_idx in range(len(members_list)):
-        
-        total_meals, total_spent, *_ = member_summary(
-            member=members_list[mem_idx],    # members_list[mem_idx]: GroupMember
-            group=group, 
-            month=current_date.month, 
-            year=current_date.year
-        )
-        
-        # group.cost_per_meal attribute added in the group_summary(..) -> Group
-        total_cost = total_meals * group.cost_per_meal
-        
-        members_list[mem_idx].total_meals = total_meals
-        members_list[mem_idx].total_cost = round(total_cost)
-        members_list[mem_idx].total_spent = total_spent
-        members_list[mem_idx].balance = round(total_spent - total_cost)
+    # member: GroupMember, figures come from the summary, no query per member
+    for member in members_list:
+        group.summary.apply_to_member(member)
+    
+    # Who pays whom to settle the month, after the payments already recorded
+    settlements = month_settlements(group, current_date.year, current_date.month).select_related('payer', 'payee')
+    group_settlement(group, members_list, list(settlements))
     
     # add members_list attribute to group 
     # to be able to access all memner of the group in template
@@ -54,7 +52,8 @@ def home(request):
     
     context = {
         'group': group,
-        'current_month': current_date
+        'current_month': current_date,
+        'past_month': is_past_month(current_date.year, current_date.month),
     }
     return render(request, 'home/dashboard.html', context)
 
@@ -70,22 +69,32 @@ def track_meals(request):
     direction = request.GET.get('dir')
     meal_date = get_date(date_str, direction)
     
-    # handle create/update MealEntry
+    # handle create/update MealEntry, the saved date is shown by a GET so a 
+    # refresh doesn't post the form again
     if request.method == 'POST':
-        handle_add_update_meals(request, group)
+        saved_meals = handle_add_update_meals(request, group)
+        if saved_meals:
+            return redirect(f"{reverse('track-meals')}?date={saved_meals[0].date:%Y-%m-%d}")
+    
+    # All the meals of the date in one query
+    meals = MealEntry.objects.filter(group=group, date=meal_date)
+    
+    meals_by_user = {meal.user_id: meal for meal in meals}
     
     # list of all member of the group
     members_list = group.members.all().select_related('user')
     
     # add needed attributes for the dashboard to each member of the group
     # member: GroupMember
-    for mem_idx in range(len(members_list)):
-        user = members_list[mem_idx].user
-        meal = user.meal_entries.filter(date=meal_date).first()
+    for member in members_list:
+        meal = meals_by_user.get(member.user_id)
+        
+        member.breakfast = meal.breakfast if meal else 0
+        member.lunch = meal.lunch if meal else 0
+        member.dinner = meal.dinner if meal else 0
         
-        members_list[mem_idx].breakfast = meal.breakfast if meal else 0
-        members_list[mem_idx].lunch = meal.lunch if meal else 0
-        members_list[mem_idx].dinner = meal.dinner if meal else 0
+        # Version of the row for the offline sync, none if not saved yet
+        member.updated_at = meal.updated_at if meal else None
     
     group.members_list = members_list
     
@@ -123,6 +132,168 @@ def member_details(request, member_pk):
     return render(request, 'home/member_details.html', context)
 
 
+@login_required
+@group_required
+def member_history_page(request, member_pk, kind):
+    """Next page of a member's meals or groceries (kind) as an HTML fragment"""
+    member = GroupMember.objects.filter(
+        pk=member_pk, 
+        group_id=request.user.group_membership.group_id
+    ).first()
+    
+    if not member:
+        return JsonResponse({'error': 'Not a valid user/member!'}, status=404)
+    
+    info_date = get_date(request.GET.get('date'), None, unit='month')
+    rows, cursor = history_page(
+        member_history(member, kind, info_date.month, info_date.year),
+        request.GET.get('cursor')
+    )
+    
+    html = render_to_string(f'home/partials/{kind}_rows.html', {kind: rows}, request=request)
+    return JsonResponse({'html': html, 'next': cursor})
+
+
+@login_required
+@group_required
+def activity(request):
+    """Timeline of the meal and grocery changes of the group, for every member to see"""
+    group = request.user.group_membership.group
+    logs, cursor = activity_page(group)
+    
+    context = {
+        'group': group,
+        'logs': logs,
+        'cursor': cursor,
+    }
+    return render(request, 'home/activity.html', context)
+
+
+@login_required
+@group_required
+def activity_history_page(request):
+    """Next page of the group's activity as an HTML fragment"""
+    logs, cursor = activity_page(request.user.group_membership.group, request.GET.get('cursor'))
+    
+    html = render_to_string('home/partials/activity_rows.html', {'logs': logs}, request=request)
+    return JsonResponse({'html': html, 'next': cursor})
+
+
+@login_required
+@group_required
+def record_settlement(request):
+    """Record a payment between two members for the month, by either of them or the admin"""
+    if request.method != 'POST':
+        messages.error(request, "Invalid request method")
+        return redirect('home')
+    
+    group = request.user.group_membership.group
+    
+    try:
+        payer_id = int(request.POST.get('payer', ''))
+        payee_id = int(request.POST.get('payee', ''))
+        amount = int(request.POST.get('amount', ''))
+        month = date.fromisoformat(request.POST.get('month', ''))
+        
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+    except ValueError as e:
+        messages.error(request, f"Invalid input: {e}")
+        return redirect('home')
+    
+    home_url = f"{reverse('home')}?date={month:%Y-%m-%d}"
+    
+    members = group.members.filter(user_id__in=[payer_id, payee_id]).count()
+    if payer_id == payee_id or members != 2:
+        messages.error(request, 'Not a valid user/member!')
+        return redirect(home_url)
+    
+    if request.user.pk not in (payer_id, payee_id, group.admin_id):
+        messages.error(request, "Permission denied")
+        return redirect(home_url)
+    
+    Settlement.objects.create(
+        group=group,
+        payer_id=payer_id,
+        payee_id=payee_id,
+        amount=amount,
+        year=month.year,
+        month=month.month,
+        recorded_by=request.user,
+    )
+    
+    messages.success(request, "Payment recorded")
+    return redirect(home_url)
+
+
+@login_required
+@group_required
+def close_month(request):
+    """Freeze the figures of a past month in a MonthSnapshot, optionally locking it, group admin only"""
+    if request.method != 'POST':
+        messages.error(request, "Invalid request method")
+        return redirect('home')
+    
+    group = request.user.group_membership.group
+    
+    try:
+        month = date.fromisoformat(request.POST.get('month', ''))
+    except ValueError:
+        messages.error(request, "Invalid date format")
+        return redirect('home')
+    
+    home_url = f"{reverse('home')}?date={month:%Y-%m-%d}"
+    
+    if group.admin_id != request.user.pk:
+        messages.error(request, "Only the group admin can close a month")
+        return redirect(home_url)
+    if not is_past_month(month.year, month.month):
+        messages.error(request, "Only a month that is over can be closed")
+        return redirect(home_url)
+    
+    if MonthSnapshot.objects.filter(group=group, year=month.year, month=month.month).exists():
+        messages.error(request, f"{month:%B %Y} is already closed")
+        return redirect(home_url)
+    
+    # The month's ledger is recalculated from every meal and grocery first, not in the request
+    locked = request.POST.get('locked') == 'on'
+    tasks.close_month.enqueue(
+        group_id=group.pk, year=month.year, month=month.month, closed_by_id=request.user.pk, locked=locked
+    )
+    
+    messages.success(request, f"{month:%B %Y} is being closed{' and locked' if locked else ''}, its figures are frozen in a moment")
+    return redirect(home_url)
+
+
+@login_required
+@group_required
+def reopen_month(request):
+    """Drop the snapshot of a closed month, its figures follow the meals and groceries again"""
+    if request.method != 'POST':
+        messages.error(request, "Invalid request method")
+        return redirect('home')
+    
+    group = request.user.group_membership.group
+    
+    try:
+        month = date.fromisoformat(request.POST.get('month', ''))
+    except ValueError:
+        messages.error(request, "Invalid date format")
+        return redirect('home')
+    
+    home_url = f"{reverse('home')}?date={month:%Y-%m-%d}"
+    
+    if group.admin_id != request.user.pk:
+        messages.error(request, "Only the group admin can reopen a month")
+        return redirect(home_url)
+    
+    if MonthSnapshot.reopen(group.pk, month.year, month.month):
+        messages.success(request, f"{month:%B %Y} reopened")
+    else:
+        messages.info(request, f"{month:%B %Y} isn't closed")
+    return redirect(home_url)
+
+
 @login_required
 @group_required
 def update_meal(request, member_pk):
@@ -150,7 +321,7 @@ def update_meal(request, member_pk):
         # Validate non-negative values
         if any(val < 0 for val in [breakfast, lunch, dinner]):
             raise ValueError("Meal counts cannot be negative")
-            
+    
     except ValueError as e:
         messages.error(request, f"Invalid input: {e}")
         return redirect('member-details', member_pk=member_pk)
@@ -170,9 +341,11 @@ def update_meal(request, member_pk):
         meal.save()
         
         messages.success(request, "Update Meal - Done")
-        
+    
     except MealEntry.DoesNotExist:
         messages.error(request, "Meal not found")
+    except MonthLocked as e:
+        messages.error(request, str(e))
     except Exception as e:
         messages.error(request, f"Error updating meal: {str(e)}")
     
@@ -205,7 +378,7 @@ def create_grocery(request, member_pk):
         if cost < 0:
             messages.error(request, "Cost cannot be negative")
             return redirect('member-details', member_pk=member_pk)
-            
+        
         # Get member with related objects
         member = GroupMember.objects.select_related('user', 'group').get(pk=member_pk)
         
@@ -224,7 +397,7 @@ def create_grocery(request, member_pk):
             cost=cost
         )
         messages.success(request, "Grocery item - added")
-        
+    
     except ValueError as e:
         if "fromisoformat" in str(e):
             messages.error(request, "Invalid date format")
@@ -233,6 +406,8 @@ def create_grocery(request, member_pk):
     except GroupMember.DoesNotExist:
         messages.error(request, "Member not found")
         return redirect('home')
+    except MonthLocked as e:
+        messages.error(request, str(e))
     except Exception as e:
         messages.error(request, f"Error creating grocery item: {str(e)}")
     
@@ -264,7 +439,7 @@ def update_grocery(request, member_pk):
         # Validate non-negative values
         if cost < 0:
             raise ValueError("Cost cannot be negative")
-            
+    
     except ValueError as e:
         messages.error(request, f"Invalid input: {e}")
         return redirect('member-details', member_pk=member_pk)
@@ -283,9 +458,11 @@ def update_grocery(request, member_pk):
         grocery.cost = cost
         grocery.save()
         messages.success(request, "Update Grocery - Done")
-        
+    
     except GroceryExpense.DoesNotExist:
         messages.error(request, "Grocery not found")
+    except MonthLocked as e:
+        messages.error(request, str(e))
     except Exception as e:
         messages.error(request, f"Error updating grocery: {str(e)}")
     
@@ -0,0 +1,45 @@
+from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+
+from app.reports import RANGES, group_report, report_months
+from app.utils import group_required
+
+
+@login_required
+@group_required
+def reports(request):
+    """Monthly series of the group and of a member over the last 12 months, this year or a custom range"""
+    group = request.user.group_membership.group
+    
+    range_name = request.GET.get('range', '12m')
+    start, end = request.GET.get('start', ''), request.GET.get('end', '')
+    
+    try:
+        months = report_months(range_name, start, end)
+    except ValueError as e:
+        messages.error(request, f"Invalid range: {e}")
+        return redirect('reports')
+    
+    report = group_report(group, months)
+    members_list = group.members.all().select_related('user')
+    
+    # The member to show the series of, the logged in user by default
+    member_pk = request.GET.get('member')
+    member = next(
+        (member for member in members_list if str(member.pk) == member_pk), 
+        next((member for member in members_list if member.user_id == request.user.pk), None)
+    )
+    
+    context = {
+        'group': group,
+        'report': report,
+        'members_list': members_list,
+        'member': member,
+        'member_series': report['members'].get(member.user_id, []) if member else [],
+        'ranges': RANGES,
+        'range_name': range_name,
+        'start': f'{months[0]:%Y-%m}',
+        'end': f'{months[-1]:%Y-%m}',
+    }
+    return render(request, 'home/reports.html', context)
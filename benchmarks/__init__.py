@@ -0,0 +1,5 @@
+"""
+Synthetic load benchmarks for the meal manager views
+
+Run with `python manage.py bench`, see the command's --help
+"""
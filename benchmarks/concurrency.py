@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client
+from django.urls import reverse
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import io
+import sys
+import time
+
+from .views import percentile
+
+
+def session_cookie(user) -> str:
+    client = Client()
+    client.force_login(user)
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def report(latencies: list, statuses: list, seconds: float) -> dict:
+    return {
+        'requests': len(latencies),
+        'errors': sum(status != 200 for status in statuses),
+        'seconds': round(seconds, 2),
+        'requests_per_second': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+    }
+
+
+def run_wsgi(path: str, cookie: str, clients: int, requests: int) -> dict:
+    """`requests` GETs of path through the WSGI handler from `clients` threads, like a threaded server"""
+    handler = WSGIHandler()
+
+    def request(_):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver',
+            'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+
+        start = time.perf_counter()
+        body = handler(environ, lambda line, headers: status.append(int(line.split()[0])))
+        b''.join(body)
+        body.close()    # request_finished, closes the thread's connection
+        return (time.perf_counter() - start) * 1000, status[0]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(request, range(requests)))
+    seconds = time.perf_counter() - start
+
+    return report([ms for ms, _ in results], [status for _, status in results], seconds)
+
+
+async def run_asgi(path: str, cookie: str, clients: int, requests: int) -> dict:
+    """`requests` GETs of path through the ASGI handler, `clients` at a time on one event loop"""
+    handler = ASGIHandler()
+    slots = asyncio.Semaphore(clients)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+
+    async def request():
+        body_sent = False
+        status = []
+
+        async def receive():
+            nonlocal body_sent
+            if body_sent:
+                # The client stays connected, the handler cancels this wait
+                await asyncio.Future()
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        async with slots:
+            start = time.perf_counter()
+            await handler(dict(scope), receive, send)
+            return (time.perf_counter() - start) * 1000, status[0]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[request() for _ in range(requests)])
+    seconds = time.perf_counter() - start
+
+    return report([ms for ms, _ in results], [status for _, status in results], seconds)
+
+
+def run_throughput(group, clients: int, requests: int) -> dict:
+    """
+    Throughput of home, track_meals and member_details with `clients`
+    concurrent clients: the sync views under WSGI and ASGI, and their
+    async versions under ASGI
+    """
+    cookie = session_cookie(group.admin)
+    member = group.members.exclude(user=group.admin).first() or group.members.first()
+
+    pages = {
+        'home': ('home', 'async-home', []),
+        'track-meals': ('track-meals', 'async-track-meals', []),
+        'member-details': ('member-details', 'async-member-details', [member.pk]),
+    }
+
+    results = {}
+    for name, (sync_view, async_view, args) in pages.items():
+        sync_path, async_path = reverse(sync_view, args=args), reverse(async_view, args=args)
+        results[name] = {
+            'wsgi': run_wsgi(sync_path, cookie, clients, requests),
+            'asgi': asyncio.run(run_asgi(sync_path, cookie, clients, requests)),
+            'asgi_async_views': asyncio.run(run_asgi(async_path, cookie, clients, requests)),
+        }
+    return results
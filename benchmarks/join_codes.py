@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import override_settings
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from app.join_codes import ALLOCATORS, COUNTER_KEY
+from app.models import Group
+
+
+class RetryCounter(logging.Handler):
+    """Counts the 'join code taken' retries logged by the allocator"""
+    
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.retries = 0
+    
+    def emit(self, record):
+        self.retries += 1
+
+
+def run_group_creates(count: int, clients: int) -> dict:
+    """
+    `count` groups created from `clients` threads at once with each join
+    code allocator, reports the creates per second, failed creates, code
+    retries and whether every code came out unique
+    """
+    logger = logging.getLogger('app.join_codes')
+    results = {}
+    
+    for allocator in ALLOCATORS:
+        users = User.objects.bulk_create([User(username=f'join-{allocator}-{index}') for index in range(count)])
+        cache.delete(COUNTER_KEY)
+        
+        # Counted instead of printed
+        counter = RetryCounter()
+        level, propagate = logger.level, logger.propagate
+        logger.addHandler(counter)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        
+        def create(user):
+            try:
+                Group.objects.create(name=f'Group of {user.username}', admin=user)
+                return None
+            except Exception as e:
+                return type(e).__name__
+            finally:
+                connection.close()
+        
+        try:
+            with override_settings(JOIN_CODE_ALLOCATOR=allocator):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    errors = [error for error in pool.map(create, users) if error]
+                seconds = time.perf_counter() - start
+        finally:
+            logger.removeHandler(counter)
+            logger.setLevel(level)
+            logger.propagate = propagate
+        
+        groups = Group.objects.filter(admin__in=users)
+        created = groups.count()
+        results[allocator] = {
+            'groups': created,
+            'errors': len(errors),
+            'error_types': sorted(set(errors)),
+            'code_retries': counter.retries,
+            'unique_codes': groups.values('join_code').distinct().count() == created,
+            'seconds': round(seconds, 2),
+            'creates_per_second': round(created / seconds, 1),
+        }
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+    
+    return results
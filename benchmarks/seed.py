@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from datetime import date, timedelta
+import random
+
+from app.models import Group, GroupMember, MealEntry, GroceryExpense, MonthlyLedger
+
+
+ITEMS = ['Rice', 'Lentils', 'Vegetables', 'Fish', 'Chicken', 'Eggs', 'Oil', 'Onion', 'Potato', 'Spices']
+
+
+def seed_data(groups: int, members: int, days: int, seed: int = 42, end: date = None):
+    """
+    Create `groups` groups of `members` members each, with meals of 
+    every member for the last `days` days and some groceries.
+    Same seed, same data.
+    Return: list of Group
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    password = make_password(None)
+    
+    users = User.objects.bulk_create(
+        User(username=f'bench-{g}-{m}', first_name=f'Member {g}-{m}', password=password)
+        for g in range(groups) for m in range(members)
+    )
+    
+    # bulk_create skips Group.save() and its signal, so fill in what they do
+    group_list = Group.objects.bulk_create(
+        Group(name=f'Bench group {g}', join_code=f'B{g:05X}', admin=users[g * members])
+        for g in range(groups)
+    )
+    GroupMember.objects.bulk_create(
+        GroupMember(
+            user=users[g * members + m], 
+            group=group, 
+            role='admin' if m == 0 else 'member'
+        )
+        for g, group in enumerate(group_list) for m in range(members)
+    )
+    
+    meals, groceries = [], []
+    for g, group in enumerate(group_list):
+        for m in range(members):
+            user = users[g * members + m]
+            
+            for day in range(days):
+                meal_date = end - timedelta(days=day)
+                meals.append(MealEntry(
+                    user=user, group=group, date=meal_date,
+                    breakfast=rng.choice([0, 1, 1, 1]),
+                    lunch=rng.choice([0, 1, 1, 2]),
+                    dinner=rng.choice([0, 1, 1, 1, 2, 3]),
+                ))
+                
+                # A few groceries a week per member
+                if rng.random() < 0.3:
+                    groceries.append(GroceryExpense(
+                        user=user, group=group, date=meal_date,
+                        item_name=rng.choice(ITEMS),
+                        quantity=f'{rng.randint(1, 5)} kg',
+                        cost=rng.randint(50, 1500),
+                    ))
+    
+    MealEntry.objects.bulk_create(meals, batch_size=1000)
+    GroceryExpense.objects.bulk_create(groceries, batch_size=1000)
+    MonthlyLedger.rebuild()
+    
+    return group_list
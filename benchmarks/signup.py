@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import User
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+import time
+
+from .views import percentile
+
+
+def profile_hashers(profile: str) -> list:
+    """PASSWORD_HASHERS with the hasher of profile first, like the PASSWORD_HASHER setting"""
+    hashers = settings.PASSWORD_HASHER_PROFILES
+    return [hashers[profile]] + [hasher for name, hasher in hashers.items() if name != profile]
+
+
+def timed_posts(url: str, posts: list) -> tuple:
+    """POST each data to url as a new visitor, return the latencies (ms) and CPU seconds"""
+    latencies = []
+    cpu = time.process_time()
+    
+    for data in posts:
+        client = Client()
+        start = time.perf_counter()
+        response = client.post(url, data)
+        latencies.append((time.perf_counter() - start) * 1000)
+        
+        if response.status_code != 302:
+            raise RuntimeError(f"POST {url} returned {response.status_code}")
+    
+    return latencies, time.process_time() - cpu
+
+
+def rate(latencies: list, cpu_seconds: float) -> dict:
+    return {
+        'per_second_per_core': round(len(latencies) / cpu_seconds, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+    }
+
+
+def run_signups(count: int) -> dict:
+    """
+    `count` sign-ups and then logins through the views for every hasher
+    profile, one after another on one thread, so per second is per core
+    """
+    results = {}
+    for profile in settings.PASSWORD_HASHER_PROFILES:
+        with override_settings(PASSWORD_HASHERS=profile_hashers(profile)):
+            try:
+                make_password('password')
+            except ValueError as e:
+                # argon2-cffi not installed
+                results[profile] = {'skipped': str(e)}
+                continue
+            
+            phones = [f'{profile}-{index:05}' for index in range(count)]
+            signups = [
+                {'full_name': 'Bench', 'phone': phone, 'password': 'password', 'confirm_password': 'password'}
+                for phone in phones
+            ]
+            logins = [{'phone': phone, 'password': 'password'} for phone in phones]
+            
+            results[profile] = {
+                'hasher': get_hasher('default').algorithm,
+                'signups': rate(*timed_posts(reverse('register'), signups)),
+                'logins': rate(*timed_posts(reverse('login'), logins)),
+            }
+            User.objects.filter(username__in=phones).delete()
+    
+    return results
+
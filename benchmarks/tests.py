@@ -0,0 +1,21 @@
+from django.db import connection
+from django.test import TestCase
+from unittest import skipUnless
+
+from benchmarks.seed import seed_data
+from benchmarks.views import explain_month_queries
+
+
+@skipUnless(connection.vendor == 'sqlite', "Checks SQLite's query plans")
+class ExplainMonthQueriesTests(TestCase):
+    """The monthly totals are read through the indexes on (group, date), not a table scan"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = seed_data(groups=1, members=5, days=40)[0]
+    
+    def test_month_totals_use_the_indexes(self):
+        for name, plans in explain_month_queries(self.group).items():
+            with self.subTest(name):
+                self.assertIn('SEARCH app_mealentry USING INDEX mealentry_group_date_cover', plans['meal_totals'])
+                self.assertRegex(plans['grocery_totals'], r'SEARCH app_groceryexpense USING (COVERING )?INDEX')
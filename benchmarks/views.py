@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.db.models import Sum
+from datetime import date
+import time
+import tracemalloc
+
+from app.models import MealEntry, GroceryExpense
+from app.utils import month_range
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(client: Client, url: str, iterations: int, warm_cache: bool = False) -> dict:
+    """Request a url `iterations` times, report query count, latency and peak memory"""
+    latencies = []
+    queries = 0
+    
+    for _ in range(iterations):
+        if not warm_cache:
+            cache.clear()
+        
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        queries = len(ctx.captured_queries)
+    
+    # Separate pass, tracing allocations slows the requests down
+    if not warm_cache:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'url': url,
+        'queries': queries,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_views(group, iterations: int, warm_cache: bool = False) -> dict:
+    """Drive home, track_meals and member_details as the admin of group"""
+    client = Client()
+    client.force_login(group.admin)
+    
+    member = group.members.exclude(user=group.admin).first() or group.members.first()
+    
+    urls = {
+        'home': reverse('home'),
+        'track-meals': reverse('track-meals'),
+        'member-details': reverse('member-details', args=[member.pk]),
+    }
+    return {
+        name: measure(client, url, iterations, warm_cache) 
+        for name, url in urls.items()
+    }
+
+
+def explain_month_queries(group, day: date = None) -> dict:
+    """
+    EXPLAIN output of the month filters, date__year/date__month lookups 
+    against the date range from month_range(..)
+    """
+    day = day or date.today()
+    month_start, month_end = month_range(day.year, day.month)
+    
+    filters = {
+        'year_month': {'date__year': day.year, 'date__month': day.month},
+        'date_range': {'date__gte': month_start, 'date__lt': month_end},
+    }
+    
+    plans = {}
+    for name, lookup in filters.items():
+        meals = MealEntry.objects.filter(group=group, **lookup).order_by().values('user').annotate(Sum('total'))
+        groceries = GroceryExpense.objects.filter(group=group, **lookup).order_by().values('user').annotate(Sum('cost'))
+        
+        plans[name] = {
+            'meal_totals': meals.explain(),
+            'grocery_totals': groceries.explain(),
+        }
+    return plans
@@ -1,5 +1,7 @@
 import os, environ
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
+from importlib.util import find_spec
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,11 +26,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.QueryBudgetMiddleware',
+    'app.middleware.PasswordRehashMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.MembershipMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'app.middleware.ReopenedMonthsMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -36,7 +42,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'app.middleware.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -55,6 +61,127 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default=f'sqlite:///{BASE_DIR}/db.sqlite3') # type: ignore
 }
 
+# Local memory (LRU) cache with DEBUG, e.g. CACHE_URL=redis://127.0.0.1:6379/1 to share it
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'), # type: ignore
+    
+    # Sessions, must be shared by all the processes (e.g. redis) when running
+    # more than one, a per-process locmem would keep serving logged out sessions
+    'sessions': env.cache('SESSION_CACHE_URL', default='locmemcache://sessions'), # type: ignore
+}
+
+# The summary cache versions (app.cache) and the sessions are only seen by the 
+# process that changed them in a locmem cache, the others would serve stale
+# month summaries and logged out sessions. Fine with runserver, not in production
+if not DEBUG:
+    for alias, cache in CACHES.items():
+        if cache['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+            raise ImproperlyConfigured(
+                f"The {alias} cache needs a shared backend with DEBUG off, set "
+                f"{'SESSION_CACHE_URL' if alias == 'sessions' else 'CACHE_URL'} (e.g. redis://127.0.0.1:6379/0)"
+            )
+
+# Sessions read from the cache, written to both the cache and the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Loads the user with its group membership and group in one query
+AUTHENTICATION_BACKENDS = ['app.backends.MembershipBackend']
+
+# Seconds to keep the monthly summary of a group cached
+SUMMARY_CACHE_TIMEOUT = env.int('SUMMARY_CACHE_TIMEOUT', default=5 * 60) # type: ignore
+SUMMARY_CACHE_PAST_TIMEOUT = env.int('SUMMARY_CACHE_PAST_TIMEOUT', default=30 * 24 * 60 * 60) # type: ignore
+
+# Max SQL queries per request of a view (by url name, or (url name, method) for
+# a method of its own), going over logs a warning or raises QueryBudgetExceeded 
+# when QUERY_BUDGET_RAISE is on (for tests)
+QUERY_BUDGETS = {
+    'home': 10,
+    'track-meals': 8,
+    ('track-meals', 'POST'): 12,
+    'member-details': 10,
+    'async-home': 10,
+    'async-track-meals': 8,
+    ('async-track-meals', 'POST'): 13,
+    'async-member-details': 10,
+    'activity': 6,
+}
+QUERY_BUDGET_RAISE = env.bool('QUERY_BUDGET_RAISE', default=False) # type: ignore
+QUERY_STATS_HEADER = env.bool('QUERY_STATS_HEADER', default=DEBUG) # type: ignore
+QUERY_STATS_SLOWEST = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'app': {
+            'handlers': ['console'],
+            'level': env('APP_LOG_LEVEL', default='INFO'), # type: ignore
+        },
+    },
+}
+
+# First hasher hashes the new passwords, the others still check existing hashes,
+# which are upgraded in the background on the next login (app.hashers.rehash_later).
+# Argon2 by default (argon2-cffi is in the requirements), scrypt (standard library)
+# when it isn't installed
+PASSWORD_HASHER_PROFILES = {
+    'argon2': 'app.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'app.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='argon2' if find_spec('argon2') else 'scrypt') # type: ignore
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_PROFILES.items() if name != PASSWORD_HASHER
+]
+
+# Cost of a hash, both at the OWASP minimum: argon2 19 MiB and 2 passes (~35 ms),
+# a fifth of Django's default memory so a burst of sign-ups doesn't exhaust the
+# server; scrypt n=2^14, r=8, p=5 (16 MiB, ~220 ms). PBKDF2 is ~350 ms
+PASSWORD_ARGON2 = {
+    'time_cost': env.int('ARGON2_TIME_COST', default=2), # type: ignore
+    'memory_cost': env.int('ARGON2_MEMORY_COST', default=19 * 1024), # type: ignore
+    'parallelism': env.int('ARGON2_PARALLELISM', default=1), # type: ignore
+}
+PASSWORD_SCRYPT = {
+    'work_factor': env.int('SCRYPT_WORK_FACTOR', default=2**14), # type: ignore
+    'block_size': 8,
+    'parallelism': env.int('SCRYPT_PARALLELISM', default=5), # type: ignore
+}
+
+# Threads upgrading outdated password hashes after the login, and how many
+# upgrades (each holding a plaintext password) may wait for them. Logins past
+# that skip the upgrade, it's tried again on their next login
+PASSWORD_REHASH_WORKERS = env.int('PASSWORD_REHASH_WORKERS', default=1) # type: ignore
+PASSWORD_REHASH_BACKLOG = env.int('PASSWORD_REHASH_BACKLOG', default=100) # type: ignore
+
+# How new join codes are picked: random, or permutation (a keyed shuffle of the
+# code space walked by a counter in the cache, collision free when the cache is
+# shared). Either way a taken code is retried, up to JOIN_CODE_ATTEMPTS times
+JOIN_CODE_ALLOCATOR = env('JOIN_CODE_ALLOCATOR', default='random') # type: ignore
+JOIN_CODE_ATTEMPTS = 10
+
+# Join code lookups: LRU of this process (entries, seconds) in front of the
+# shared cache, where codes are kept JOIN_CODE_CACHE_TIMEOUT seconds and codes
+# of no group JOIN_CODE_MISS_TIMEOUT seconds
+JOIN_CODE_LRU_SIZE = 10_000
+JOIN_CODE_LRU_TIMEOUT = 30
+JOIN_CODE_CACHE_TIMEOUT = 10 * 60
+JOIN_CODE_MISS_TIMEOUT = 60
+
+# Token buckets by scope, per client IP and per logged in user: (burst, tokens a minute)
+RATE_LIMITS = {
+    'join-group': {
+        'ip': (20, 5),
+        'user': (5, 1),
+    },
+}
+# Behind a proxy, the header with the client address, e.g. HTTP_X_FORWARDED_FOR
+RATE_LIMIT_IP_HEADER = env('RATE_LIMIT_IP_HEADER', default=None) # type: ignore
+
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -88,11 +215,46 @@ else:
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/login/'
 
+# System checks
+# Covering indexes (INCLUDE columns) only exist on PostgreSQL, 
+# SQLite builds them as plain indexes
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# Keep the meals and groceries of members who leave a group in archive tables
+ARCHIVE_LEFT_MEMBER_ENTRIES = env.bool('ARCHIVE_LEFT_MEMBER_ENTRIES', default=False) # type: ignore
+
 # Email settings for Gmail SMTP
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env('GMAIL_HOST_USER', default=None) # type: ignore
 EMAIL_HOST_PASSWORD = env('GMAIL_HOST_PASSWORD', default=None) # type: ignore
 EMAIL_USE_LOCALTIME = True
+
+# Mail is queued as tasks and delivered by the run_tasks worker through 
+# EMAIL_DELIVERY_BACKEND: Gmail SMTP when configured, else files in EMAIL_FILE_PATH
+EMAIL_BACKEND = 'app.mail.QueuedEmailBackend'
+EMAIL_DELIVERY_BACKEND = env('EMAIL_DELIVERY_BACKEND', default=None) or ( # type: ignore
+    'django.core.mail.backends.smtp.EmailBackend' if EMAIL_HOST_USER 
+    else 'django.core.mail.backends.filebased.EmailBackend'
+)
+EMAIL_FILE_PATH = env('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails')) # type: ignore
+
+# Background tasks (app.tasks), run by `manage.py run_tasks`. TASKS_EAGER runs
+# them in the process after the commit instead, when there is no worker, which
+# is the default with DEBUG so a plain runserver needs no worker
+TASKS_EAGER = env.bool('TASKS_EAGER', default=DEBUG) # type: ignore
+TASKS_MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled on each one up to TASKS_RETRY_MAX_DELAY
+TASKS_RETRY_DELAY = 30
+TASKS_RETRY_MAX_DELAY = 60 * 60
+# A task running longer than this is taken for lost with its worker and queued again
+TASKS_TIMEOUT = 30 * 60
+# A task still queued after this many seconds is reported as waiting for a worker
+TASKS_PICKUP_TIMEOUT = 30
+# Done and failed tasks are deleted by the worker after this many days
+TASKS_KEEP_DAYS = 7
+
+# Files of the queued exports, deleted after EXPORT_KEEP_DAYS
+EXPORT_ROOT = env('EXPORT_ROOT', default=str(BASE_DIR / 'exports')) # type: ignore
+EXPORT_KEEP_DAYS = 2
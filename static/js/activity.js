@@ -0,0 +1,33 @@
+// ---------- Load more activity on scroll ---------------
+// The list ends with an .activity-more element holding the url and
+// the cursor of the next page, fetched when it scrolls into view
+const activityObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) loadNextPage(entry.target);
+    });
+});
+
+document.querySelectorAll('.activity-more').forEach(more => {
+    if (more.dataset.next) activityObserver.observe(more);
+});
+
+async function loadNextPage(more) {
+    if (more.dataset.loading || !more.dataset.next) return;
+    more.dataset.loading = '1';
+
+    try {
+        const url = `${more.dataset.url}?cursor=${encodeURIComponent(more.dataset.next)}`;
+        const response = await fetch(url, {headers: {'Accept': 'application/json'}});
+        if (!response.ok) throw new Error(response.statusText);
+
+        const page = await response.json();
+        more.insertAdjacentHTML('beforebegin', page.html);
+        more.dataset.next = page.next || '';
+
+        if (!page.next) activityObserver.unobserve(more);
+    } catch (error) {
+        console.error('Could not load more activity:', error);
+    } finally {
+        delete more.dataset.loading;
+    }
+}
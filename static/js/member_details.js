@@ -22,17 +22,25 @@ document.querySelectorAll('.tab-btn').forEach(btn => {
 });
 
 
+// Row being edited in the meal/grocery modal, updated in place on save
+let editingRow = null;
+
+
 // ---------- Meal edit functionality -------------
-document.querySelectorAll('.meal-edit-btn').forEach(btn => {
-    btn.addEventListener('click', function() {
-        const meal_id = this.closest('.grid').querySelector('.meal-id').textContent;
-        const date = this.closest('.grid').querySelector('.date').textContent;
-        const breakfast = this.closest('.grid').querySelector('.breakfast').textContent;
-        const lunch = this.closest('.grid').querySelector('.lunch').textContent;
-        const dinner = this.closest('.grid').querySelector('.dinner').textContent;
+// Delegated, rows of the later pages are added after page load
+document.addEventListener('click', function(e) {
+    const btn = e.target.closest('.meal-edit-btn');
+    if (!btn) return;
 
-        openMealModal(meal_id, date, breakfast, lunch, dinner);
-    });
+    const row = btn.closest('.grid');
+    editingRow = row;
+    const meal_id = row.querySelector('.meal-id').textContent;
+    const date = row.querySelector('.date').textContent;
+    const breakfast = row.querySelector('.breakfast').textContent;
+    const lunch = row.querySelector('.lunch').textContent;
+    const dinner = row.querySelector('.dinner').textContent;
+
+    openMealModal(meal_id, date, breakfast, lunch, dinner);
 });
 
 
@@ -85,16 +93,20 @@ document.querySelectorAll('.grocery-delete').forEach(btn => {
 
 
 // ---------- Grocery edit functionality ---------------
-document.querySelectorAll('.grocery-edit').forEach(btn => {
-    btn.addEventListener('click', function() {
-        const grocery_id = this.closest('.grid').querySelector('.grocery-id').textContent;
-        const date = this.closest('.grid').querySelector('.date').textContent;
-        const itemName = this.closest('.grid').querySelector('.grocery-name').textContent;
-        const quantity = this.closest('.grid').querySelector('.quantity').textContent;
-        const cost = this.closest('.grid').querySelector('.grocery-cost').textContent;
+// Delegated, rows of the later pages are added after page load
+document.addEventListener('click', function(e) {
+    const btn = e.target.closest('.grocery-edit');
+    if (!btn) return;
 
-        openGroceryModal(grocery_id, date, itemName, quantity, cost);
-    });
+    const row = btn.closest('.grid');
+    editingRow = row;
+    const grocery_id = row.querySelector('.grocery-id').textContent;
+    const date = row.querySelector('.date').textContent;
+    const itemName = row.querySelector('.grocery-name').textContent;
+    const quantity = row.querySelector('.quantity').textContent;
+    const cost = row.querySelector('.grocery-cost').textContent;
+
+    openGroceryModal(grocery_id, date, itemName, quantity, cost);
 });
 
 
@@ -134,3 +146,129 @@ document.getElementById('closeAddGroceryModal').addEventListener('click', () =>
     // Reset form (optional)
     document.getElementById('addGroceryForm').reset();
 });
+
+
+// ---------- Load more meals/groceries on scroll ---------------
+// Each list ends with a .history-more element holding the url and
+// the cursor of the next page, fetched when it scrolls into view
+const historyObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) loadNextPage(entry.target);
+    });
+});
+
+document.querySelectorAll('.history-more').forEach(more => {
+    if (more.dataset.next) historyObserver.observe(more);
+});
+
+async function loadNextPage(more) {
+    if (more.dataset.loading || !more.dataset.next) return;
+    more.dataset.loading = '1';
+
+    try {
+        const url = `${more.dataset.url}&cursor=${encodeURIComponent(more.dataset.next)}`;
+        const response = await fetch(url, {headers: {'Accept': 'application/json'}});
+        if (!response.ok) throw new Error(response.statusText);
+
+        const page = await response.json();
+        more.insertAdjacentHTML('beforebegin', page.html);
+        more.dataset.next = page.next || '';
+
+        if (!page.next) historyObserver.unobserve(more);
+    } catch (error) {
+        console.error('Could not load more rows:', error);
+    } finally {
+        delete more.dataset.loading;
+    }
+}
+
+
+// ---------- Save edits through the JSON API ---------------
+// Updates the edited row and the month figures in place instead of
+// reloading the page, falls back to the regular form post when offline.
+// fetch() only rejects (with a TypeError) when the request never got an
+// answer; any answer, even an HTML error page, ends in an ApiError
+async function postJson(form, url, data) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': form.querySelector('[name=csrfmiddlewaretoken]').value,
+        },
+        body: JSON.stringify(data),
+    });
+    const isJson = (response.headers.get('Content-Type') || '').includes('application/json');
+    if (!response.ok) {
+        const result = isJson ? await response.json().catch(() => ({})) : {};
+        throw new ApiError(result.error || `Save failed: ${response.status} ${response.statusText}`);
+    }
+    if (!isJson) throw new ApiError('Save failed: unexpected response, reload the page');
+    return response.json();
+}
+
+class ApiError extends Error {}
+
+function updateFigures(member) {
+    document.querySelectorAll('[data-figure]').forEach(el => {
+        const value = member[el.dataset.figure];
+        if (value !== undefined) el.textContent = value;
+    });
+}
+
+function saveInPlace(form, modalId, buildRequest, updateRow) {
+    form.addEventListener('submit', async function(e) {
+        e.preventDefault();
+        const [url, data] = buildRequest();
+
+        let result;
+        try {
+            result = await postJson(form, url, data);
+        } catch (error) {
+            if (error instanceof TypeError) {
+                // Offline, nothing reached the server
+                form.submit();
+            } else {
+                alert(error.message);
+            }
+            return;
+        }
+
+        if (editingRow) updateRow(editingRow, result);
+        updateFigures(result.member);
+        document.getElementById(modalId).classList.add('hidden');
+    });
+}
+
+const mealEditForm = document.getElementById('mealEditForm');
+saveInPlace(mealEditForm, 'mealEditModal',
+    () => [
+        `${mealEditForm.dataset.api}${document.getElementById('meal_id').value}/`,
+        {
+            breakfast: document.getElementById('edit_breakfast').value,
+            lunch: document.getElementById('edit_lunch').value,
+            dinner: document.getElementById('edit_dinner').value,
+        },
+    ],
+    (row, result) => {
+        row.querySelector('.breakfast').textContent = result.meal.breakfast;
+        row.querySelector('.lunch').textContent = result.meal.lunch;
+        row.querySelector('.dinner').textContent = result.meal.dinner;
+    }
+);
+
+const groceryEditForm = document.getElementById('groceryEditForm');
+saveInPlace(groceryEditForm, 'groceryEditModal',
+    () => [
+        `${groceryEditForm.dataset.api}${document.getElementById('grocery_id').value}/`,
+        {
+            item_name: document.getElementById('edit_grocery_name').value,
+            quantity: document.getElementById('edit_grocery_quantity').value,
+            cost: document.getElementById('edit_grocery_cost').value,
+        },
+    ],
+    (row, result) => {
+        row.querySelector('.grocery-name').textContent = result.grocery.item_name;
+        row.querySelector('.quantity').textContent = result.grocery.quantity;
+        row.querySelector('.grocery-cost').textContent = result.grocery.cost;
+    }
+);
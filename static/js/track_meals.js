@@ -0,0 +1,175 @@
+// ---------- Offline meal tracking -------------
+// Edits are queued on the device and sent to the sync endpoint in one request,
+// they survive a lost connection or a closed tab until the server has them
+const QUEUE_KEY = 'meal-sync-queue';
+
+const form = document.getElementById('trackMealsForm');
+const statusBox = document.getElementById('syncStatus');
+const mealDate = form.querySelector('[name=meal_date]').value;
+const rows = form.querySelectorAll('.meal-row');
+
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register(form.dataset.worker);
+}
+
+
+function loadQueue() {
+    try {
+        return JSON.parse(localStorage.getItem(QUEUE_KEY)) || {};
+    } catch (error) {
+        return {};
+    }
+}
+
+function saveQueue(queue) {
+    localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+}
+
+function showStatus(message) {
+    statusBox.textContent = message;
+    statusBox.classList.toggle('hidden', !message);
+}
+
+function rowValues(row) {
+    const values = {};
+    row.querySelectorAll('[data-meal]').forEach(input => {
+        values[input.dataset.meal] = Number(input.value) || 0;
+    });
+    return values;
+}
+
+function findRow(member, date) {
+    if (date !== mealDate) return null;
+    return form.querySelector(`.meal-row[data-member="${member}"]`);
+}
+
+
+// Only the rows changed since the page loaded get queued
+const initial = new Map();
+rows.forEach(row => initial.set(row, JSON.stringify(rowValues(row))));
+
+// Rows of this date still waiting to sync show the queued values
+const queued = loadQueue();
+Object.values(queued).forEach(entry => {
+    const row = findRow(entry.member, entry.date);
+    if (!row) return;
+
+    row.querySelectorAll('[data-meal]').forEach(input => {
+        input.value = entry[input.dataset.meal];
+    });
+});
+
+
+form.addEventListener('submit', function(e) {
+    e.preventDefault();
+    const queue = loadQueue();
+    let changed = 0;
+
+    rows.forEach(row => {
+        const values = rowValues(row);
+        if (JSON.stringify(values) === initial.get(row)) return;
+
+        const key = `${row.dataset.member}_${mealDate}`;
+        queue[key] = {
+            id: key,
+            member: Number(row.dataset.member),
+            date: mealDate,
+            ...values,
+            // Keep the version the first queued edit was made on
+            base: queue[key] ? queue[key].base : (row.dataset.updated || null),
+        };
+        initial.set(row, JSON.stringify(values));
+        changed++;
+    });
+
+    if (!changed && !Object.keys(queue).length) {
+        showStatus('No changes to save.');
+        return;
+    }
+
+    saveQueue(queue);
+    syncMeals();
+});
+
+
+let syncing = false;
+
+async function syncMeals() {
+    const queue = loadQueue();
+    const entries = Object.values(queue);
+
+    if (!entries.length || syncing) return;
+    if (!navigator.onLine) {
+        showStatus(`Offline: ${entries.length} meal edits saved on this device, they will sync when back online.`);
+        return;
+    }
+
+    syncing = true;
+    try {
+        const response = await fetch(form.dataset.sync, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': form.querySelector('[name=csrfmiddlewaretoken]').value,
+            },
+            body: JSON.stringify({ entries }),
+        });
+        if (!response.ok) throw new Error(response.statusText);
+
+        const { results } = await response.json();
+        showStatus(applyResults(queue, results));
+    } catch (error) {
+        showStatus(`Not synced yet: ${entries.length} meal edits saved on this device, will retry.`);
+    } finally {
+        syncing = false;
+    }
+}
+
+
+// Drop the synced entries from the queue, return the status message
+function applyResults(sent, results) {
+    // Edits queued while the request was out stay for the next sync
+    const queue = loadQueue();
+    const notes = [];
+    let saved = 0;
+
+    results.forEach(result => {
+        const entry = sent[result.id];
+        if (!entry) return;
+
+        const edited = JSON.stringify(queue[result.id]) !== JSON.stringify(entry);
+        if (!edited) delete queue[result.id];
+
+        const row = findRow(entry.member, entry.date);
+        if (result.meal) {
+            if (row) row.dataset.updated = result.meal.updated_at;
+            // A newer edit of a saved row now goes on top of the saved version
+            if (edited && queue[result.id] && result.status !== 'conflict') {
+                queue[result.id].base = result.meal.updated_at;
+            }
+        }
+
+        if (result.status === 'conflict') {
+            // Someone else changed the row meanwhile, theirs is kept
+            if (row && !edited) {
+                row.querySelectorAll('[data-meal]').forEach(input => {
+                    input.value = result.meal[input.dataset.meal];
+                });
+                initial.set(row, JSON.stringify(rowValues(row)));
+            }
+            const name = row ? row.querySelector('span').textContent.trim() : `member ${entry.member}`;
+            notes.push(`${name} on ${entry.date} was changed by someone else, kept their entry.`);
+        } else if (result.status === 'error') {
+            notes.push(`Meal of ${entry.date} not saved: ${result.error}`);
+        } else {
+            saved++;
+        }
+    });
+
+    saveQueue(queue);
+    return [saved ? `Meal entries saved: ${saved}.` : '', ...notes].join(' ').trim();
+}
+
+
+window.addEventListener('online', syncMeals);
+syncMeals();
@@ -0,0 +1,70 @@
+{% load static %}// Service worker of the offline track meals page.
+// Static files are served from the cache and refreshed in the background,
+// the track meals page comes from the network, or from the cache when offline.
+// Meal edits are queued by track_meals.js, not here
+const CACHE = 'meal-manager-v1';
+const TRACK_MEALS = '{% url "track-meals" %}';
+const STATIC_FILES = [
+    '{% static "css/tailwind.css" %}',
+    '{% static "js/script.js" %}',
+    '{% static "js/track_meals.js" %}',
+];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE).then(cache => cache.addAll(STATIC_FILES)).then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => key !== CACHE).map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) return;
+
+    if (STATIC_FILES.includes(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(request));
+    } else if (url.pathname === TRACK_MEALS) {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+async function staleWhileRevalidate(request) {
+    const cache = await caches.open(CACHE);
+    const cached = await cache.match(request);
+    const update = fetch(request).then(response => {
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+    });
+
+    if (cached) {
+        update.catch(() => {});
+        return cached;
+    }
+    return update;
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE);
+    try {
+        const response = await fetch(request);
+
+        if (response.redirected) {
+            // Logged out, don't keep the member's pages on the device
+            await caches.delete(CACHE);
+        } else if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        // Offline, the page of this date or else the last one seen
+        return (await cache.match(request)) || (await cache.match(TRACK_MEALS, { ignoreSearch: true })) || Response.error();
+    }
+}